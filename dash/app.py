@@ -1,31 +1,15 @@
 import streamlit as st
 
 import plotly.express as px
-import pandas as pd
 from millify import millify
 from streamlit_extras.metric_cards import style_metric_cards
 import plotly.graph_objects as go
 
-st.set_page_config(page_title="Grocery", page_icon=':green_apple:', layout="wide", initial_sidebar_state='expanded')
-from pages import first_page, second_page, third_page  
+from grocery import baskets, figcache, filters, metrics, periods, pool, queries, series, store, streaming, warmup
 
-data = pd.read_csv('./dataset/grocery_final.csv')
-labels = {'Under 25': 'Menos de 25', '65+': 'Mais de 65', '25-34': 'Entre 25 e 34', '45-54': 'Entre 45 e 54',
-          '35-44': 'Entre 35 e 44', '55-64': 'Entre 55 e 64'}
-data['household_age'] = data['household_age'].map(labels)
-
-custom_order = ['Menos de 25', 'Entre 25 e 34', 'Entre 35 e 44', 'Entre 45 e 54', 'Entre 55 e 64', 'Mais de 65']
-data_1 = pd.DataFrame({'Age': custom_order})
-mapping = {age: i for i, age in enumerate(custom_order)}
-data['order'] = data['household_age'].map(mapping)
-
-data_sorted = data.sort_values(by='order')
-data_sorted.drop(columns=['order'], inplace=True)
-data_sorted.reset_index()
-
-def grafico_8(data_sorted):
-    top_product_sales = data_sorted.groupby('product_type')['sales_value'].sum().nlargest(10).reset_index()
+q = queries.backend()
 
+def grafico_8(top_product_sales):
     figura = px.bar(top_product_sales, x='sales_value', y='product_type', orientation='h', title='Top 10 - Produtos mais vendidos',
                  labels={'sales_value': 'Vendas', 'product_type': 'Produtos'},
                  category_orders={'product_type': top_product_sales['product_type'].tolist()})
@@ -40,9 +24,7 @@ def grafico_8(data_sorted):
 
     return figura
 
-def grafico_9(data_sorted):
-    top_product_sales = data_sorted.groupby('product_department')['sales_value'].sum().nlargest(11).reset_index()
-
+def grafico_9(top_product_sales):
     figura = px.bar(top_product_sales, x='sales_value', y='product_department', orientation='h', title='Top 10 - Categoria de produtos mais vendidos',
                  labels={'sales_value': 'Vendas', 'product_department': 'Departamentos'},
                  category_orders={'product_department': top_product_sales['product_department'].tolist()})
@@ -58,20 +40,13 @@ def grafico_9(data_sorted):
     return figura
 
 
-def grafico_10(data_sorted):
-    data_sorted['transaction_timestamp'] = pd.to_datetime(data_sorted['transaction_timestamp'])
-    sales_by_department_month = \
-    data_sorted.groupby([data_sorted['transaction_timestamp'].dt.month, 'product_department'])[
-        ['quantity', 'sales_value']].sum().reset_index()
-    sales_by_department_month.rename(columns={'transaction_timestamp': 'Month'}, inplace=True)
-
-    top_3_products = sales_by_department_month.groupby('product_department')['sales_value'].sum().nlargest(3).index
-    sales_by_department_month = sales_by_department_month[
-        sales_by_department_month['product_department'].isin(top_3_products)]
+def grafico_10(sales_by_department_month):
+    sales_by_department_month = sales_by_department_month.rename(columns={'period': 'Month'})
 
     month_names = ['Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho', 'Julho', 'Agosto', 'Setembro', 'Outubro',
                    'Novembro', 'Dezembro']
-    sales_by_department_month['Month'] = sales_by_department_month['Month'].apply(lambda x: month_names[x - 1])
+    # Com mais de um ano de dados o mês leva o ano, para não juntar meses de anos diferentes
+    sales_by_department_month['Month'] = periods.month_labels(sales_by_department_month['Month'], month_names)
 
     fig = px.bar(sales_by_department_month, x='Month', y='sales_value', color='product_department', width=680,
                  title='Top 3 - Evolução das três categórias de produtos mais vendidos ao longo do ano',
@@ -93,115 +68,202 @@ def grafico_10(data_sorted):
 
     return fig
 
-# Creates the container for page title
-dash_1 = st.container()
 
-with dash_1:
-    st.markdown(
-        """
-        <div style='text-align: center; padding: 10px; background-color: #9DDE8B; color: white; font-size: 24px; border-radius: 10px;'>
-            Grocery Store DashBoard
-        </div>
-        """, unsafe_allow_html=True)
-    st.write("")
+def grafico_16(vendas, frequencia):
+    # Detalhe do grafico_10 ao dia ou à hora: traços WebGL, com a série já reduzida no servidor
+    fig = px.line(vendas, x='time', y='sales_value', color='product_department', width=680, render_mode='webgl',
+                  title='Top 3 - Evolução das vendas ' + ('por hora' if frequencia == 'h' else 'por dia'),
+                  labels={'sales_value': 'Soma das Vendas', 'time': 'Data', 'product_department': 'Categoria de produto:'},
+                  color_discrete_map={'GROCERY': '#006769', 'MEAT': '#FF9F66', 'PRODUCE': '#9DDE8B'})
+    fig.update_layout(
+        plot_bgcolor='white',
+        title_x=0.08,
+        legend=dict(
+            orientation='h',
+            yanchor='bottom',
+            y=-0.5,
+            xanchor='center',
+            x=0.5,
+        )
+    )
+
+    return fig
+
 
-# Creates the container for metric card
-dash_2 = st.container()
+def evolucao_vendas(periodo, janela):
+    # Os mesmos três departamentos do gráfico mensal, ao dia ou à hora dentro da janela
+    departamentos = q.department_month(3, **periodo)['product_department'].unique().tolist()
+    vendas, frequencia = series.department_sales(departamentos, *janela)
+    return grafico_16(vendas, frequencia)
+
+
+def calcular_kpis(start=None, end=None):
+    if start is not None or end is not None:
+        # Intervalo de datas: rollup diário e tabela de cestos, ambos ordenados por data
+        totais = q.period_totals(start, end)
+        return totais['sales'], len(totais['stores']), baskets.stats(start=start, end=end)['count']
+
+    if streaming.MODE:
+        # Modo streaming: lê o CSV por blocos, sem o carregar todo em memória
+        indicadores = streaming.cached_kpis()
+        return indicadores['total_sales'], indicadores['total_stores'], indicadores['total_orders']
+
+    # Os KPIs são mantidos pela ingestão, incluindo os lotes acrescentados
+    totais = store.totals()
+    return totais['sales'], len(totais['stores']), totais['baskets']
+
+
+def calcular_estatisticas_cesto(**filtros):
+    # Tabela de factos dos cestos (uma linha por cesto), já calculada na ingestão
+    estatisticas = baskets.stats(**filtros)
+    average_basket_value_rounded = round(estatisticas['mean'], 2)
+    return average_basket_value_rounded, estatisticas['min'], estatisticas['max']
+
+
+def calcular_cesto_medio(**periodo):
+    if streaming.MODE and not periodo:
+        return streaming.cached_kpis()['basket_mean']
+    valor_medio, valor_min, valor_max = calcular_estatisticas_cesto(**periodo)
+    return valor_medio
+
+
+def grafico_11(valor_medio):
+    meta_objectivo = 45 # objectivo do valor médio
+    meta_min = 30 # valor minimo
+    meta = 80 # valor acima das expectativas
+
+    value = valor_medio
+
+
+    fig = go.Figure(go.Indicator(
+        mode="gauge+number",
+        value=value,
+        title={'text': "Cesto Médio"},
+        number={'suffix': " $"},
+        gauge={
+            'axis': {'range': [meta_min, meta]},
+            'bar': {'color': "#005C53"},
+            'threshold': {
+                'line': {'color': "red", 'width': 4},
+                'thickness': 0.75,
+                'value': meta_objectivo
+            }
+        }
+    ))
+
+    fig.update_layout(height=400, width=800)
+    fig.add_annotation(
+        x=0.25, y=0.9,
+        xref='paper', yref='paper',
+        text="Objetivo",
+        showarrow=True,
+        arrowhead=5,
+        ax=-45, ay=-30,
+        font=dict(size=12, color="red"),
+        align="center"
+    )
 
-with dash_2:
-    # Get KPI metrics
-    total_sales = (data_sorted['quantity'] * data_sorted['sales_value']).sum()
+    return fig
 
-    total_stores = len(data_sorted['store_id'].unique())
 
-    total_orders = data_sorted['basket_id'].nunique()
+# O seletor de vista e o gráfico de evolução formam um fragmento: mudar a vista ou a
+# janela não recalcula os outros gráficos da página
+@st.fragment
+def evolucao_departamentos(periodo):
+    with metrics.fragment('app.grafico_10'):
+        janela = filters.drill_down('app.grafico_10', periodo)
+        if janela is None:
+            figura = figcache.figura('app.grafico_10', lambda: grafico_10(q.department_month(3, **periodo)), **periodo)
+            metrics.plotly_chart('grafico_10', figura)
+        else:
+            figura = figcache.figura('app.grafico_16', lambda: evolucao_vendas(periodo, janela), janela=janela, **periodo)
+            metrics.plotly_chart('grafico_16', figura)
 
 
+def app():
+    metrics.start_page('home')
 
-    col1, col2, col3 = st.columns(3)
-    # Create column span
-    col1.metric(label="Vendas Anuais", value="$" + millify(total_sales, precision=2))
-    col2.metric(label="N.º Lojas", value=total_stores)
+    # Creates the container for page title
+    dash_1 = st.container()
 
-    col3.metric(label="N.º Ordens", value=total_orders)
+    with dash_1:
+        st.markdown(
+            """
+            <div style='text-align: center; padding: 10px; background-color: #9DDE8B; color: white; font-size: 24px; border-radius: 10px;'>
+                Grocery Store DashBoard
+            </div>
+            """, unsafe_allow_html=True)
+        st.write("")
 
-    # This is used to style the metric card
-    style_metric_cards(border_left_color="#DBF227")
+    # Creates the container for metric card
+    dash_2 = st.container()
 
+    with dash_2:
+        # Get KPI metrics (no intervalo de datas escolhido na barra lateral, se houver)
+        periodo = filters.period()
+        selecao = filters.selection()
+        total_sales, total_stores, total_orders = calcular_kpis(**periodo)
 
-    dash_3 = st.container()
+        col1, col2, col3 = st.columns(3)
+        # Create column span
+        col1.metric(label="Vendas no Período" if periodo else "Vendas Anuais", value="$" + millify(total_sales, precision=2))
+        col2.metric(label="N.º Lojas", value=total_stores)
 
-    with dash_3:
-        col1, col2 = st.columns(2)
+        col3.metric(label="N.º Ordens", value=total_orders)
 
-        grafico_8 = grafico_8(data_sorted)
-        grafico_9 = grafico_9(data_sorted)
-        grafico_10 = grafico_10(data_sorted)
+        # This is used to style the metric card
+        style_metric_cards(border_left_color="#DBF227")
 
-        with col1:
-            st.plotly_chart(grafico_8,use_container_width=True)
 
-        with col2:
-            st.plotly_chart(grafico_9,use_container_width=True)
+        # Os quatro gráficos são independentes: com GROCERY_WORKERS > 1 são calculados em
+        # paralelo e cada um aparece no seu lugar assim que fica pronto
+        graficos = pool.ChartBatch()
 
+        dash_3 = st.container()
 
-    dash_4 = st.container()
+        with dash_3:
+            col1, col2 = st.columns(2)
 
-    def calcular_estatisticas_cesto(data_sorted):
-        cesto = data_sorted.copy()
-        cesto['total_value'] = cesto['sales_value'] * cesto['quantity']
-        basket_totals = cesto.groupby('basket_id')['total_value'].sum()
+            graficos.add('grafico_8', col1.empty(), lambda: figcache.figura('app.grafico_8', lambda: grafico_8(q.top_products(10, **selecao)), **selecao),
+                         use_container_width=True)
+            graficos.add('grafico_9', col2.empty(), lambda: figcache.figura('app.grafico_9', lambda: grafico_9(q.top_departments(11, **selecao)), **selecao),
+                         use_container_width=True)
 
-        average_basket_value = basket_totals.mean()
-        average_basket_value_rounded = round(average_basket_value, 2)
 
-        min_basket_value = basket_totals.min()
-        max_basket_value = basket_totals.max()
+        dash_4 = st.container()
 
-        return average_basket_value_rounded, min_basket_value, max_basket_value
+        with dash_4:
+            col1, col2 = st.columns([1, 1])
 
-    with dash_4:
-        col1, col2 = st.columns([1, 1])
+            graficos.add('cesto_medio', col1.empty(), lambda: grafico_11(calcular_cesto_medio(**periodo)), use_container_width=True)
 
-        with col1:
-            valor_medio, valor_min, valor_max = calcular_estatisticas_cesto(data_sorted)
+            # Os outros gráficos são calculados enquanto o fragmento desenha o seu
+            graficos.start()
+            with col2:
+                evolucao_departamentos(periodo)
 
-            meta_objectivo = 45 # objectivo do valor médio
-            meta_min = 30 # valor minimo
-            meta = 80 # valor acima das expectativas
+        graficos.render()
 
-            value = valor_medio
+    metrics.end_page()
 
 
-            fig = go.Figure(go.Indicator(
-                mode="gauge+number",
-                value=value,
-                title={'text': "Cesto Médio"},
-                number={'suffix': " $"},
-                gauge={
-                    'axis': {'range': [meta_min, meta]},
-                    'bar': {'color': "#005C53"},
-                    'threshold': {
-                        'line': {'color': "red", 'width': 4},
-                        'thickness': 0.75,
-                        'value': meta_objectivo
-                    }
-                }
-            ))
+if __name__ == "__main__":
+    st.set_page_config(page_title="Grocery", page_icon=':green_apple:', layout="wide", initial_sidebar_state='expanded')
 
-            fig.update_layout(height=400, width=800)
-            fig.add_annotation(
-                x=0.25, y=0.9,
-                xref='paper', yref='paper',
-                text="Objetivo",
-                showarrow=True,
-                arrowhead=5,
-                ax=-45, ay=-30,
-                font=dict(size=12, color="red"),
-                align="center"
-            )
+    # Pré-carregamento opcional dos dados partilhados (GROCERY_WARMUP=1), uma vez por processo
+    warmup.start()
 
-            st.plotly_chart(fig, use_container_width=True)
+    # Filtros comuns a todas as páginas: datas e filtros cruzados
+    filters.date_filter()
+    filters.cross_filter()
 
-        with col2:
-            st.plotly_chart(grafico_10)
+    # As páginas só são lidas e executadas quando são abertas: abrir a página inicial não
+    # importa nem calcula nada das outras
+    pagina = st.navigation([
+        st.Page(app, title='Grocery', icon='🍏', default=True),
+        st.Page('pages/first_page.py', title='Clientes', icon='🍏'),
+        st.Page('pages/second_page.py', title='Lojas', icon='🍏'),
+        st.Page('pages/third_page.py', title='Vendas', icon='🍏'),
+        st.Page('pages/fourth_page.py', title='Produtos', icon='🍏'),
+    ])
+    pagina.run()
@@ -0,0 +1,234 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from grocery import metrics
+
+# Benchmarks da ingestão e de cada gráfico a várias escalas.
+#
+#   python -m benchmarks.bench run --rows 100000 1000000 10000000
+#   python -m benchmarks.bench compare results/<antes>.json results/<depois>.json
+#
+# Cada escala corre num processo à parte (com GROCERY_DATA_DIR a apontar para um CSV
+# sintético), para que o pico de memória de uma escala não contamine a seguinte.
+
+RAIZ = Path(__file__).resolve().parent
+DATA_DIR = RAIZ / '.data'
+RESULTS_DIR = RAIZ / 'results'
+
+
+class _Amostrador(threading.Thread):
+    # Lê o RSS de poucos em poucos milissegundos para apanhar o pico de cada passo
+    def __init__(self, intervalo=0.005):
+        super().__init__(daemon=True)
+        self.intervalo = intervalo
+        self.pico = metrics.rss_mb()
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.is_set():
+            self.pico = max(self.pico, metrics.rss_mb())
+            time.sleep(self.intervalo)
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+        self.pico = max(self.pico, metrics.rss_mb())
+        return self.pico
+
+
+def medir(funcao, repeat=1):
+    tempos = []
+    inicio_rss = metrics.rss_mb()
+    amostrador = _Amostrador()
+    amostrador.start()
+    try:
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            funcao()
+            tempos.append(time.perf_counter() - t0)
+    finally:
+        pico = amostrador.parar()
+    return {
+        'wall_s': statistics.median(tempos),
+        'min_s': min(tempos),
+        'peak_rss_mb': round(pico, 1),
+        'rss_delta_mb': round(pico - inicio_rss, 1),
+    }
+
+
+def _passos(csv_path):
+    import pandas as pd
+
+    import app
+    from grocery import baskets, bitmaps, boxstats, periods, products, queries, store, streaming
+    from pages import first_page, second_page, third_page
+
+    q = queries.backend()
+
+    def primeira_loja():
+        return store.stores()[0]
+
+    def intervalo():
+        # Terço do meio do período, como na verificação de paridade
+        primeiro, ultimo = store.date_bounds()
+        return {'start': primeiro + (ultimo - primeiro) // 3, 'end': primeiro + 2 * (ultimo - primeiro) // 3}
+
+    def semana():
+        # Janela curta: os gráficos de detalhe passam a ser à hora
+        primeiro, _ = store.date_bounds()
+        return primeiro, primeiro + timedelta(days=7)
+
+    # (nome, função, repetições, limpar caches antes)
+    yield 'csv_load', lambda: pd.read_csv(csv_path), 1, False
+    yield 'ingest', lambda: store.ingest(csv_path), 1, True
+    yield 'columnar_load', store.load, 1, True
+    yield 'columnar_load_projected', lambda: store.load(['store_id', 'sales_value']), 1, True
+    yield 'cube_load', store.load_cube, 1, True
+    # Sem intervalo os KPIs vêm do manifesto; com intervalo são calculados sobre o rollup diário
+    # e a tabela de cestos (o primeiro passo inclui a leitura de ambos)
+    periodo = intervalo()
+    yield 'kpis_load', lambda: app.calcular_kpis(**periodo), 1, True
+    yield 'kpis', lambda: app.calcular_kpis(**periodo), 3, False
+    yield 'kpis_streaming', streaming.kpis, 1, False
+    yield 'calcular_estatisticas_cesto', lambda: app.calcular_estatisticas_cesto(), 3, False
+    yield 'calcular_estatisticas_cesto_range', lambda: app.calcular_estatisticas_cesto(**periodo), 3, False
+    yield 'app.grafico_8', lambda: app.grafico_8(q.top_products(10)), 3, False
+    yield 'app.grafico_9', lambda: app.grafico_9(q.top_departments(11)), 3, False
+    yield 'app.grafico_10', lambda: app.grafico_10(q.department_month(3)), 3, False
+    yield 'app.grafico_16', lambda: app.evolucao_vendas({}, store.date_bounds()), 3, False
+    yield 'app.grafico_16_hourly', lambda: app.evolucao_vendas({}, semana()), 3, False
+    yield 'first_page.grafico_12', lambda: first_page.grafico_12(first_page.preparar_dados(q.age_counts())), 3, False
+    yield 'first_page.grafico_13', lambda: first_page.grafico_13(q.income_counts()), 3, False
+    yield 'first_page.grafico_7', lambda: first_page.grafico_7(q.hour_counts(), 8, 22), 3, False
+    yield 'second_page.grafico_10', lambda: second_page.grafico_10(q.store_period()), 3, False
+    yield 'second_page.grafico_4', lambda: second_page.grafico_4(boxstats.por_loja()), 1, True
+    yield 'second_page.grafico_14', lambda: second_page.grafico_14(baskets.histogram(), baskets.percentiles((0.25, 0.5, 0.75, 0.9))), 3, False
+    yield 'second_page.grafico_15', lambda: second_page.grafico_15(baskets.mean_by('household_age')), 3, False
+    yield 'third_page.grafico1', lambda: third_page.grafico1(q.store_department(primeira_loja()), primeira_loja()), 3, False
+    yield 'third_page.grafico2', lambda: third_page.grafico2(q.store_month(primeira_loja()), primeira_loja()), 3, False
+    yield 'third_page.grafico3', lambda: third_page.grafico3(q.age_department(store.AGE_ORDER[1:3]), store.AGE_ORDER[1:3]), 3, False
+    yield 'third_page.grafico4', lambda: third_page.evolucao_loja(primeira_loja(), store.date_bounds()), 3, False
+    yield 'third_page.grafico4_hourly', lambda: third_page.evolucao_loja(primeira_loja(), semana()), 3, False
+    yield 'third_page.grafico5', lambda: third_page.grafico5(periods.compare('month', against='year', store_id=primeira_loja()),
+                                                             'Ano anterior'), 3, False
+
+    # Filtros cruzados compostos: o primeiro passo inclui a construção do índice de bitmaps
+    filtros = {'household_age': store.AGE_ORDER[1:3], 'household_income': store.INCOME_ORDER[:4], 'household_size': ['1', '2']}
+    yield 'bitmaps_index', bitmaps.build, 1, True
+    yield 'app.grafico_8_filtered', lambda: app.grafico_8(q.top_products(10, **filtros)), 3, False
+    yield 'third_page.grafico1_filtered', lambda: third_page.grafico1(q.store_department(primeira_loja(), **filtros), primeira_loja()), 3, False
+
+    # Ranking de produtos: construção do índice, cauda longa, top por loja e pesquisa por prefixo
+    yield 'products_index', products.size, 1, True
+    yield 'products_tail', lambda: products.top(20, products.size() // 2), 3, False
+    yield 'products_top_store', lambda: products.top(20, store_id=primeira_loja()), 3, False
+    yield 'products_search', lambda: products.search('be'), 3, False
+
+
+def trabalhador(csv_path):
+    # Corre dentro do subprocesso de uma escala
+    import streamlit as st
+    from grocery import store
+
+    shutil.rmtree(store.STORE_DIR, ignore_errors=True)
+    resultados = {}
+    for nome, funcao, repeat, limpar in _passos(csv_path):
+        if limpar:
+            st.cache_resource.clear()
+        resultados[nome] = medir(funcao, repeat)
+        print(f"  {nome}: {resultados[nome]['wall_s']:.4f}s, pico {resultados[nome]['peak_rss_mb']} MB", file=sys.stderr)
+    return resultados
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=RAIZ, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def correr(escalas, backend=None, saida=None):
+    from grocery import synth
+    import pandas as pd
+
+    resultado = {
+        'commit': _commit(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'backend': backend or os.environ.get('GROCERY_BACKEND', 'pandas'),
+        'cpus': os.cpu_count(),
+        'scales': {},
+    }
+
+    for linhas in escalas:
+        pasta = DATA_DIR / str(linhas)
+        csv_path = pasta / 'grocery_final.csv'
+        if not csv_path.exists():
+            print(f"A gerar {linhas} linhas...", file=sys.stderr)
+            synth.write_csv(csv_path, linhas)
+
+        print(f"Escala {linhas}:", file=sys.stderr)
+        env = dict(os.environ, GROCERY_DATA_DIR=str(pasta), GROCERY_BACKEND=resultado['backend'])
+        processo = subprocess.run([sys.executable, '-m', 'benchmarks.bench', 'worker', str(csv_path)],
+                                  cwd=RAIZ.parent, env=env, stdout=subprocess.PIPE, check=True, text=True)
+        resultado['scales'][str(linhas)] = json.loads(processo.stdout.strip().splitlines()[-1])
+
+    saida = Path(saida or RESULTS_DIR / f"{resultado['commit']}-{resultado['backend']}.json")
+    saida.parent.mkdir(parents=True, exist_ok=True)
+    saida.write_text(json.dumps(resultado, indent=1))
+    print(f"Resultados em {saida}", file=sys.stderr)
+    return resultado
+
+
+def comparar(antes, depois, limite=1.2):
+    # Mostra a razão depois/antes de cada passo; devolve os passos que pioraram acima do limite
+    a = json.loads(Path(antes).read_text())
+    b = json.loads(Path(depois).read_text())
+    regressoes = []
+    print(f"{'escala':>10} {'passo':<32} {'antes':>10} {'depois':>10} {'razão':>7}")
+    for escala, passos in b['scales'].items():
+        for passo, medida in passos.items():
+            anterior = a['scales'].get(escala, {}).get(passo)
+            if anterior is None:
+                continue
+            razao = medida['wall_s'] / anterior['wall_s'] if anterior['wall_s'] else float('inf')
+            marca = ' !' if razao > limite else ''
+            print(f"{escala:>10} {passo:<32} {anterior['wall_s']:>10.4f} {medida['wall_s']:>10.4f} {razao:>7.2f}{marca}")
+            if razao > limite:
+                regressoes.append((escala, passo, razao))
+    return regressoes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmarks do dashboard')
+    sub = parser.add_subparsers(dest='comando', required=True)
+    p_run = sub.add_parser('run', help='Corre os benchmarks e guarda os resultados em JSON')
+    p_run.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000, 10_000_000])
+    p_run.add_argument('--backend', choices=['pandas', 'duckdb', 'polars'])
+    p_run.add_argument('--out', type=Path)
+    p_compare = sub.add_parser('compare', help='Compara dois ficheiros de resultados')
+    p_compare.add_argument('antes', type=Path)
+    p_compare.add_argument('depois', type=Path)
+    p_compare.add_argument('--threshold', type=float, default=1.2)
+    p_worker = sub.add_parser('worker')
+    p_worker.add_argument('csv', type=Path)
+    args = parser.parse_args()
+
+    if args.comando == 'run':
+        correr(args.rows, args.backend, args.out)
+    elif args.comando == 'compare':
+        sys.exit(1 if comparar(args.antes, args.depois, args.threshold) else 0)
+    else:
+        print(json.dumps(trabalhador(args.csv)))
@@ -0,0 +1,251 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from benchmarks.bench import DATA_DIR, RAIZ, RESULTS_DIR, _Amostrador, _commit
+
+# Teste de carga: N sessões simultâneas no mesmo processo, como num servidor Streamlit,
+# cada uma a abrir páginas e a mexer nos filtros através da API de testes do Streamlit
+# (AppTest), sobre um CSV sintético do tamanho pedido.
+#
+#   python -m benchmarks.load --rows 1000000 --sessions 8 --iterations 25 --p95 2 --p99 5 --rss-mb 4096
+#
+# Mede a latência de cada rerun (p50/p95/p99, no total e por ação), o débito (reruns por
+# segundo) e o pico de RSS do processo. Termina com código 1 quando algum limite é
+# ultrapassado ou quando alguma página dá erro.
+#
+# O AppTest não corre fragmentos isoladamente: mexer num filtro dentro de um fragmento
+# volta a correr a página toda, por isso as latências medidas são um limite superior.
+# A primeira visita a cada página (que compila o script) é feita uma sessão de cada vez:
+# compilar em várias threads ao mesmo tempo falha no Python 3.11 ("AST constructor
+# recursion depth mismatch").
+
+PAGINAS = {
+    'home': 'app.py',
+    'first_page': 'pages/first_page.py',
+    'second_page': 'pages/second_page.py',
+    'third_page': 'pages/third_page.py',
+    'fourth_page': 'pages/fourth_page.py',
+}
+
+_compilar = threading.Lock()
+
+
+def _widget(at, tipo, rotulo):
+    return next(w for w in getattr(at, tipo) if w.label == rotulo)
+
+
+def _acoes(pagina, at, rng):
+    # Uma alteração de filtro possível na página, escolhida ao acaso
+    if pagina == 'home':
+        vista = _widget(at, 'radio', 'Vista')
+        return 'home:vista', lambda: vista.set_value(rng.choice(vista.options))
+    if pagina == 'first_page':
+        escolha = rng.choice(['horas', 'desagregar'])
+        if escolha == 'horas':
+            inicio = rng.randint(8, 15)
+            fim = rng.randint(inicio, 22)
+
+            def horas():
+                _widget(at, 'slider', 'Hora de Início').set_value(inicio)
+                _widget(at, 'slider', 'Hora de Fim').set_value(fim)
+            return 'first_page:horas', horas
+        radio = _widget(at, 'radio', 'Desagregar por')
+        return 'first_page:desagregar', lambda: radio.set_value(rng.choice(radio.options))
+    if pagina == 'second_page':
+        loja = _widget(at, 'selectbox', 'Selecione uma loja:')
+        return 'second_page:loja', lambda: loja.set_value(rng.choice(loja.options))
+
+    if pagina == 'fourth_page':
+        escolha = rng.choice(['ranking', 'pesquisa'])
+        if escolha == 'ranking':
+            ranking = _widget(at, 'radio', 'Ranking por')
+            return 'fourth_page:ranking', lambda: ranking.set_value(rng.choice(ranking.options))
+        pesquisa = _widget(at, 'text_input', 'Pesquisar produto')
+        return 'fourth_page:pesquisa', lambda: pesquisa.set_value(rng.choice(['be', 'ch', 'fr', 'so', 'm']))
+
+    escolha = rng.choice(['loja', 'faixas'])
+    if escolha == 'loja':
+        loja = _widget(at, 'selectbox', 'Selecione uma loja')
+        return 'third_page:loja', lambda: loja.set_value(rng.choice(loja.options))
+    faixas = _widget(at, 'multiselect', 'Selecione as faixas etárias para comparar')
+    return 'third_page:faixas', lambda: faixas.set_value(rng.sample(faixas.options, rng.randint(1, 3)))
+
+
+def _sessao(numero, iteracoes, seed, medidas, erros, timeout):
+    # Uma sessão: cada iteração abre uma página (na primeira visita) ou muda um filtro nela
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed + numero)
+    abertas = {}
+    for _ in range(iteracoes):
+        pagina = rng.choice(list(PAGINAS))
+        at = abertas.get(pagina)
+        if at is None:
+            at = abertas[pagina] = AppTest.from_file(str(RAIZ.parent / PAGINAS[pagina]), default_timeout=timeout)
+            acao, alterar = f'{pagina}:abrir', None
+        else:
+            try:
+                acao, alterar = _acoes(pagina, at, rng)
+            except StopIteration:
+                # O filtro não está na página (por exemplo depois de um erro): volta a abri-la
+                erros.append(f'{pagina}: filtro em falta')
+                abertas.pop(pagina)
+                continue
+
+        inicio = time.perf_counter()
+        try:
+            if alterar is None:
+                with _compilar:
+                    inicio = time.perf_counter()
+                    at.run()
+            else:
+                alterar()
+                at.run()
+        except Exception as erro:
+            erros.append(f'{acao}: {erro!r}')
+            abertas.pop(pagina, None)
+            continue
+        medidas.append((acao, time.perf_counter() - inicio))
+        erros.extend(f'{acao}: {excecao.value}' for excecao in at.exception)
+
+
+def _percentis(tempos):
+    if not tempos:
+        return {'count': 0, 'p50_s': None, 'p95_s': None, 'p99_s': None, 'max_s': None}
+    tempos = sorted(tempos)
+
+    def p(q):
+        return round(tempos[min(int(q * len(tempos)), len(tempos) - 1)], 4)
+    return {'count': len(tempos), 'p50_s': p(0.50), 'p95_s': p(0.95), 'p99_s': p(0.99), 'max_s': round(tempos[-1], 4)}
+
+
+def trabalhador(sessoes, iteracoes, seed, timeout):
+    # Corre dentro do subprocesso (com GROCERY_DATA_DIR já definido)
+    from streamlit import config
+
+    from grocery import store
+
+    # A ingestão não conta para as latências: só o serviço das páginas
+    store.ensure_ingested()
+
+    # Cada AppTest.run liga a opção global.appTest só durante o rerun e repõe o valor
+    # anterior no fim; com várias sessões, o fim de um rerun desligava-a a meio de outro
+    config.set_option('global.appTest', True)
+
+    medidas, erros = [], []
+    amostrador = _Amostrador()
+    amostrador.start()
+    inicio = time.perf_counter()
+    threads = [threading.Thread(target=_sessao, args=(i, iteracoes, seed, medidas, erros, timeout), name=f'sessao-{i}')
+               for i in range(sessoes)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duracao = time.perf_counter() - inicio
+    pico = amostrador.parar()
+
+    acoes = sorted({acao for acao, _ in medidas})
+    return {
+        'sessions': sessoes,
+        'iterations': iteracoes,
+        'wall_s': round(duracao, 3),
+        'throughput_rps': round(len(medidas) / duracao, 2) if duracao else 0.0,
+        'peak_rss_mb': round(pico, 1),
+        'reruns': _percentis([t for _, t in medidas]),
+        'actions': {acao: _percentis([t for a, t in medidas if a == acao]) for acao in acoes},
+        'errors': erros[:50],
+        'error_count': len(erros),
+    }
+
+
+def verificar(resultado, p50=None, p95=None, p99=None, rss_mb=None, min_throughput=None):
+    # Lista dos limites ultrapassados (vazia quando está tudo dentro do orçamento)
+    falhas = []
+    reruns = resultado['reruns']
+    for nome, limite in (('p50_s', p50), ('p95_s', p95), ('p99_s', p99)):
+        if limite is not None and reruns[nome] is not None and reruns[nome] > limite:
+            falhas.append(f"{nome} {reruns[nome]:.3f}s > {limite}s")
+    if rss_mb is not None and resultado['peak_rss_mb'] > rss_mb:
+        falhas.append(f"peak_rss_mb {resultado['peak_rss_mb']} > {rss_mb}")
+    if min_throughput is not None and resultado['throughput_rps'] < min_throughput:
+        falhas.append(f"throughput_rps {resultado['throughput_rps']} < {min_throughput}")
+    if resultado['error_count']:
+        falhas.append(f"{resultado['error_count']} erros nas páginas")
+    return falhas
+
+
+def correr(linhas, sessoes, iteracoes, seed=0, timeout=120, saida=None):
+    from grocery import synth
+
+    pasta = DATA_DIR / str(linhas)
+    csv_path = pasta / 'grocery_final.csv'
+    if not csv_path.exists():
+        print(f"A gerar {linhas} linhas...", file=sys.stderr)
+        synth.write_csv(csv_path, linhas)
+
+    # Um processo novo por teste, com os dados sintéticos e sem caches de outras corridas
+    env = dict(os.environ, GROCERY_DATA_DIR=str(pasta))
+    processo = subprocess.run([sys.executable, '-m', 'benchmarks.load', 'worker', str(sessoes), str(iteracoes),
+                               '--seed', str(seed), '--timeout', str(timeout)],
+                              cwd=RAIZ.parent, env=env, stdout=subprocess.PIPE, check=True, text=True)
+    resultado = json.loads(processo.stdout.strip().splitlines()[-1])
+    resultado.update({'commit': _commit(), 'date': time.strftime('%Y-%m-%dT%H:%M:%S'), 'rows': linhas,
+                      'backend': os.environ.get('GROCERY_BACKEND', 'pandas')})
+
+    saida = Path(saida or RESULTS_DIR / f"load-{resultado['commit']}-{linhas}-{sessoes}.json")
+    saida.parent.mkdir(parents=True, exist_ok=True)
+    saida.write_text(json.dumps(resultado, indent=1))
+    return resultado, saida
+
+
+def _mostrar(resultado):
+    print(f"{resultado['sessions']} sessões x {resultado['iterations']} iterações em {resultado['wall_s']}s: "
+          f"{resultado['throughput_rps']} reruns/s, pico de RSS {resultado['peak_rss_mb']} MB")
+    print(f"{'ação':<24} {'n':>5} {'p50':>8} {'p95':>8} {'p99':>8} {'máx':>8}")
+    for acao, medida in [('total', resultado['reruns'])] + list(resultado['actions'].items()):
+        print(f"{acao:<24} {medida['count']:>5} {medida['p50_s']:>8.3f} {medida['p95_s']:>8.3f} "
+              f"{medida['p99_s']:>8.3f} {medida['max_s']:>8.3f}")
+    for erro in resultado['errors'][:10]:
+        print(f"erro: {erro}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Teste de carga com sessões simultâneas')
+    sub = parser.add_subparsers(dest='comando')
+    p_worker = sub.add_parser('worker')
+    p_worker.add_argument('sessions', type=int)
+    p_worker.add_argument('iterations', type=int)
+    p_worker.add_argument('--seed', type=int, default=0)
+    p_worker.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--rows', type=int, default=100_000, help='Linhas do CSV sintético')
+    parser.add_argument('--sessions', type=int, default=8, help='Sessões simultâneas')
+    parser.add_argument('--iterations', type=int, default=20, help='Reruns por sessão')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=120, help='Tempo máximo de um rerun (s)')
+    parser.add_argument('--p50', type=float, help='Limite da latência p50 (s)')
+    parser.add_argument('--p95', type=float, help='Limite da latência p95 (s)')
+    parser.add_argument('--p99', type=float, help='Limite da latência p99 (s)')
+    parser.add_argument('--rss-mb', type=float, help='Limite do pico de RSS (MB)')
+    parser.add_argument('--min-throughput', type=float, help='Mínimo de reruns por segundo')
+    parser.add_argument('--out', type=Path)
+    args = parser.parse_args()
+
+    if args.comando == 'worker':
+        print(json.dumps(trabalhador(args.sessions, args.iterations, args.seed, args.timeout)))
+        sys.exit(0)
+
+    resultado, saida = correr(args.rows, args.sessions, args.iterations, args.seed, args.timeout, args.out)
+    _mostrar(resultado)
+    print(f"Resultados em {saida}")
+    falhas = verificar(resultado, args.p50, args.p95, args.p99, args.rss_mb, args.min_throughput)
+    for falha in falhas:
+        print(f"FALHOU: {falha}")
+    sys.exit(1 if falhas else 0)
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from grocery import store
+
+# Análise da distribuição dos cestos sobre a tabela de factos publicada em cada versão.
+# A tabela é guardada em memória como arrays numpy contíguos (categorias como códigos
+# inteiros), por isso filtrar e agregar milhões de cestos é uma questão de máscaras e
+# np.bincount, sem passar por groupby.
+#
+# Filtros aceites por todas as funções (valor único ou lista, como em cube.rollup):
+# store_id, household_age, household_income e household_size; start/end são dias
+# (incluídos). A tabela está ordenada pelo momento da compra, por isso o intervalo de
+# datas é resolvido por pesquisa binária e os outros filtros só olham para essa fatia.
+
+PERCENTIS = (0.1, 0.25, 0.5, 0.75, 0.9, 0.99)
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _tabela(versao):
+    cestos = store.load_baskets(versao)
+    if not cestos['transaction_timestamp'].is_monotonic_increasing:
+        cestos = cestos.sort_values('transaction_timestamp', kind='stable', ignore_index=True)
+    tabela = {
+        'total_value': np.ascontiguousarray(cestos['total_value'].to_numpy(dtype='float64')),
+        'items': np.ascontiguousarray(cestos['items'].to_numpy(dtype='int32')),
+        'quantity': np.ascontiguousarray(cestos['quantity'].to_numpy(dtype='int32')),
+        'timestamp': np.ascontiguousarray(cestos['transaction_timestamp'].to_numpy(dtype='datetime64[ns]')),
+        'categorias': {},
+    }
+    for coluna in store.ATRIBUTOS_CESTOS:
+        tabela[coluna] = np.ascontiguousarray(cestos[coluna].cat.codes.to_numpy())
+        tabela['categorias'][coluna] = cestos[coluna].cat.categories
+    return tabela
+
+
+def _fatia(tabela, start=None, end=None):
+    if start is None and end is None:
+        return slice(None)
+    return slice(*store.search_range(tabela['timestamp'], start, end))
+
+
+def _mascara(tabela, fatia, **filtros):
+    mascara = None
+    for coluna, valor in filtros.items():
+        if coluna not in tabela['categorias']:
+            raise ValueError(f"Filtro desconhecido: {coluna}")
+        valores = valor if isinstance(valor, (list, tuple, set, pd.Index)) else [valor]
+        codigos = tabela['categorias'][coluna].get_indexer(list(valores))
+        condicao = np.isin(tabela[coluna][fatia], codigos[codigos >= 0])
+        mascara = condicao if mascara is None else mascara & condicao
+    return mascara
+
+
+def _selecionar(coluna, start=None, end=None, **filtros):
+    tabela = _tabela(store.ensure_ingested())
+    fatia = _fatia(tabela, start, end)
+    mascara = _mascara(tabela, fatia, **filtros)
+    valores = tabela[coluna][fatia]
+    return valores if mascara is None else valores[mascara]
+
+
+def stats(**filtros):
+    # Valores do indicador do cesto médio
+    valores = _selecionar('total_value', **filtros)
+    if len(valores) == 0:
+        return {'count': 0, 'mean': float('nan'), 'min': float('nan'), 'max': float('nan')}
+    return {'count': len(valores), 'mean': float(valores.mean()), 'min': float(valores.min()), 'max': float(valores.max())}
+
+
+def percentiles(qs=PERCENTIS, **filtros):
+    valores = _selecionar('total_value', **filtros)
+    if len(valores) == 0:
+        return {q: float('nan') for q in qs}
+    return dict(zip(qs, np.quantile(valores, qs).tolist()))
+
+
+def histogram(bins=40, limite=None, **filtros):
+    # Contagem de cestos por intervalo de valor. Por omissão corta no percentil 99, para
+    # que meia dúzia de cestos enormes não esmaguem o resto da distribuição
+    valores = _selecionar('total_value', **filtros)
+    if limite is None and len(valores):
+        limite = float(np.quantile(valores, 0.99))
+    contagens, limites = np.histogram(valores, bins=bins, range=(0, limite or 1))
+    return pd.DataFrame({'bin_start': limites[:-1], 'bin_end': limites[1:], 'baskets': contagens})
+
+
+def mean_by(por, start=None, end=None, **filtros):
+    # Cesto médio (valor, linhas e unidades) por loja ou por atributo do agregado familiar
+    tabela = _tabela(store.ensure_ingested())
+    if por not in tabela['categorias']:
+        raise ValueError(f"Dimensão desconhecida: {por}")
+    fatia = _fatia(tabela, start, end)
+    mascara = _mascara(tabela, fatia, **filtros)
+
+    # Código -1 = atributo em falta: fica de fora
+    selecao = tabela[por][fatia] >= 0 if mascara is None else mascara & (tabela[por][fatia] >= 0)
+    codigos = tabela[por][fatia][selecao]
+    n = len(tabela['categorias'][por])
+    contagem = np.bincount(codigos, minlength=n)
+    resultado = pd.DataFrame({por: tabela['categorias'][por], 'baskets': contagem})
+    for coluna in ['total_value', 'items', 'quantity']:
+        valores = tabela[coluna][fatia][selecao]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            resultado[f'mean_{coluna}'] = np.bincount(codigos, weights=valores, minlength=n) / contagem
+    return resultado[resultado['baskets'] > 0].reset_index(drop=True)
@@ -0,0 +1,179 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+
+from grocery import metrics, store
+
+# Índice de bitmaps sobre as transações, para filtros cruzados. Para cada valor das
+# dimensões abaixo guarda-se um bitset com um bit por linha (palavras de 64 bits), por
+# isso uma seleção composta é um OR dos valores escolhidos em cada dimensão e um AND
+# entre dimensões, sem voltar a percorrer as colunas. A agregação final conta e soma
+# só as linhas do bitmap, com np.bincount sobre os códigos das categorias.
+#
+# Filtros (valor único ou lista, como em cube.rollup): store_id, product_department,
+# household_age, household_income e household_size. select() devolve o bitmap de um
+# filtro; union() e intersect() combinam bitmaps de filtros diferentes.
+#
+# O índice só é construído quando um filtro é usado (as opções dos filtros vêm do
+# manifesto) e é lido das transações partilhadas em memória (store.shared): as medidas
+# ficam como vistas sobre os ficheiros Arrow mapeados, sem cópia, e os índices dos
+# dicionários de cada parte são convertidos uma vez nos códigos das categorias da versão.
+
+DIMENSOES = ['store_id', 'product_department', 'household_age', 'household_income', 'household_size']
+AGRUPAMENTOS = DIMENSOES + ['product_type']
+MEDIDAS = ['sales_value', 'quantity', 'rows']
+
+
+def _empacotar(condicao):
+    # Bit i = linha i; completa com zeros até um múltiplo de 64 linhas
+    bits = np.packbits(condicao, bitorder='little')
+    return np.pad(bits, (0, -len(bits) % 8)).view(np.uint64)
+
+
+def _tipo(lotes, coluna):
+    # Categorias da versão: a união dos dicionários das partes, pela ordem conhecida da coluna
+    valores = pa.chunked_array([lote.column(coluna).dictionary for lote in lotes]).unique()
+    return store.category_dtype(coluna, valores.to_pylist())
+
+
+def _codigos(lotes, coluna, tipo):
+    # Códigos das categorias da versão (-1 = valor em falta) a partir dos índices dos dicionários de cada lote
+    n = len(tipo.categories)
+    codigos = np.empty(sum(len(lote) for lote in lotes), dtype=np.int8 if n < 2 ** 7 else np.int16 if n < 2 ** 15 else np.int32)
+    inicio = 0
+    for lote in lotes:
+        valores = lote.column(coluna)
+        traducao = tipo.categories.get_indexer(valores.dictionary.to_pandas()).astype(codigos.dtype)
+        fatia = codigos[inicio:inicio + len(lote)]
+        fatia[:] = traducao[valores.indices.to_numpy(zero_copy_only=False)]
+        if valores.null_count:
+            fatia[valores.is_null().to_numpy(zero_copy_only=False)] = -1
+        inicio += len(lote)
+    return codigos
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _indice(versao):
+    with metrics.timed('load:bitmaps'):
+        lotes = store.shared(AGRUPAMENTOS + ['sales_value', 'quantity'], version=versao).to_batches()
+        tipos = {coluna: _tipo(lotes, coluna) for coluna in AGRUPAMENTOS}
+        indice = {
+            'linhas': sum(len(lote) for lote in lotes),
+            'inicios': np.cumsum([0] + [len(lote) for lote in lotes]),
+            'codigos': {coluna: _codigos(lotes, coluna, tipos[coluna]) for coluna in AGRUPAMENTOS},
+            'tipos': tipos,
+            # Vistas sobre os ficheiros mapeados, uma por lote
+            'medidas': {medida: [lote.column(medida).to_numpy(zero_copy_only=False) for lote in lotes]
+                        for medida in ['sales_value', 'quantity']},
+            'bitmaps': {},
+        }
+
+        # Um bitmap por valor observado de cada dimensão (product_type só serve para agrupar)
+        for coluna in DIMENSOES:
+            codigos = indice['codigos'][coluna]
+            indice['bitmaps'][coluna] = {codigo: _empacotar(codigos == codigo)
+                                         for codigo in range(len(indice['tipos'][coluna].categories))}
+    return indice
+
+
+def _atual():
+    return _indice(store.ensure_ingested())
+
+
+def values(coluna):
+    # Valores de uma dimensão, pela ordem das categorias (as faixas etárias e de rendimento são
+    # ordenadas); vêm do manifesto, por isso não constroem o índice
+    if coluna not in DIMENSOES:
+        raise ValueError(f"Filtro desconhecido: {coluna}")
+    return store.categories(coluna)
+
+
+def build():
+    # Constrói o índice da versão publicada (o primeiro filtro usado fá-lo de qualquer forma)
+    return count(select(store_id=values('store_id')))
+
+
+def _vazio(indice):
+    return np.zeros((indice['linhas'] + 63) // 64, dtype=np.uint64)
+
+
+def select(**filtros):
+    # None = sem filtro (todas as linhas)
+    if not filtros:
+        return None
+    indice = _atual()
+    mapa = None
+    for coluna, valor in filtros.items():
+        if coluna not in indice['bitmaps']:
+            raise ValueError(f"Filtro desconhecido: {coluna}")
+        valores = valor if isinstance(valor, (list, tuple, set, pd.Index)) else [valor]
+        codigos = indice['tipos'][coluna].categories.get_indexer(list(valores))
+
+        dimensao = _vazio(indice)
+        for codigo in codigos[codigos >= 0]:
+            dimensao |= indice['bitmaps'][coluna][codigo]
+        mapa = dimensao if mapa is None else np.bitwise_and(mapa, dimensao, out=mapa)
+    return mapa
+
+
+def union(*mapas):
+    if any(mapa is None for mapa in mapas):
+        return None
+    return np.bitwise_or.reduce(mapas) if mapas else None
+
+
+def intersect(*mapas):
+    mapas = [mapa for mapa in mapas if mapa is not None]
+    return np.bitwise_and.reduce(mapas) if mapas else None
+
+
+def count(mapa):
+    if mapa is None:
+        return _atual()['linhas']
+    return int(np.bitwise_count(mapa).sum())
+
+
+def rollup(por, medidas=MEDIDAS, mapa=None, **filtros):
+    # Como cube.rollup, mas sobre as linhas do bitmap 'mapa' e/ou dos filtros
+    indice = _atual()
+    por = [por] if isinstance(por, str) else list(por)
+    if filtros:
+        mapa = intersect(mapa, select(**filtros))
+
+    linhas = None
+    if mapa is not None:
+        linhas = np.unpackbits(mapa.view(np.uint8), count=indice['linhas'], bitorder='little').view(bool)
+
+    def coluna(valores):
+        return valores if linhas is None else valores[linhas]
+
+    def valores(nome):
+        # Valores das linhas escolhidas, lote a lote
+        limites = zip(indice['inicios'][:-1], indice['inicios'][1:])
+        partes = [lote if linhas is None else lote[linhas[a:b]] for lote, (a, b) in zip(indice['medidas'][nome], limites)]
+        return np.concatenate(partes) if partes else np.empty(0)
+
+    # Uma célula por combinação das dimensões 'por' (código -1 = valor em falta, fica de fora)
+    tamanhos = [len(indice['tipos'][dimensao].categories) for dimensao in por]
+    codigos = [coluna(indice['codigos'][dimensao]).astype(np.int64) for dimensao in por]
+    presentes = np.logical_and.reduce([c >= 0 for c in codigos])
+    celulas = np.ravel_multi_index([c[presentes] for c in codigos], tamanhos)
+    n = int(np.prod(tamanhos))
+
+    contagem = np.bincount(celulas, minlength=n)
+    resultado = {}
+    for medida in medidas:
+        if medida == 'rows':
+            resultado[medida] = contagem
+        else:
+            somas = np.bincount(celulas, weights=valores(medida)[presentes], minlength=n)
+            resultado[medida] = somas.astype(np.float64 if medida == 'sales_value' else np.int64)
+
+    ocupadas = np.flatnonzero(contagem)
+    tabela = {}
+    for dimensao, codigos_dimensao in zip(por, np.unravel_index(ocupadas, tamanhos)):
+        tabela[dimensao] = pd.Categorical.from_codes(codigos_dimensao, dtype=indice['tipos'][dimensao])
+    for medida in medidas:
+        tabela[medida] = resultado[medida][ocupadas]
+    return pd.DataFrame(tabela)
@@ -0,0 +1,60 @@
+import numpy as np
+import streamlit as st
+
+from grocery import store
+
+# Resumo das caixas (boxplot) calculado no servidor: quartis, bigodes e uma amostra
+# limitada de outliers por loja. O browser recebe meia dúzia de números por loja em vez
+# de todas as vendas.
+
+MAX_OUTLIERS = 200
+
+
+def resumir(valores, max_outliers=MAX_OUTLIERS, seed=0):
+    valores = np.asarray(valores, dtype='float64')
+    valores = valores[~np.isnan(valores)]
+    if len(valores) == 0:
+        return None
+
+    # Mesmo método de quartis que o Plotly usa por omissão ('linear')
+    q1, mediana, q3 = np.quantile(valores, [0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    limite_inf = q1 - 1.5 * iqr
+    limite_sup = q3 + 1.5 * iqr
+
+    dentro = valores[(valores >= limite_inf) & (valores <= limite_sup)]
+    outliers = valores[(valores < limite_inf) | (valores > limite_sup)]
+    n_outliers = len(outliers)
+
+    # Amostra dos outliers, mantendo sempre o mínimo e o máximo
+    if n_outliers > max_outliers:
+        rng = np.random.default_rng(seed)
+        amostra = rng.choice(outliers, size=max_outliers - 2, replace=False)
+        outliers = np.concatenate([[outliers.min(), outliers.max()], amostra])
+
+    return {
+        'q1': float(q1),
+        'median': float(mediana),
+        'q3': float(q3),
+        'lowerfence': float(dentro.min()),
+        'upperfence': float(dentro.max()),
+        'mean': float(valores.mean()),
+        'count': int(len(valores)),
+        'outliers': outliers.tolist(),
+        'n_outliers': int(n_outliers),
+    }
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _por_loja(versao, coluna):
+    # Uma loja de cada vez: a memória usada é a da maior loja, não a do conjunto todo
+    resumos = {}
+    for loja in store.manifest(versao)['stores']:
+        resumo = resumir(store.read_store(loja, [coluna], versao)[coluna])
+        if resumo is not None:
+            resumos[loja] = resumo
+    return resumos
+
+
+def por_loja(coluna='sales_value'):
+    return _por_loja(store.ensure_ingested(), coluna)
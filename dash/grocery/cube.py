@@ -0,0 +1,65 @@
+import pandas as pd
+
+# Cubo de agregados: uma linha por combinação observada das dimensões abaixo.
+# Os gráficos agregam o cubo (milhares de linhas) em vez das transações (milhões).
+
+DIMENSOES = ['store_id', 'period', 'month', 'hour', 'product_department', 'product_type', 'household_age', 'household_income']
+MEDIDAS = ['sales_value', 'quantity', 'rows', 'baskets']
+
+
+def build(df):
+    # 'month' depende de 'period', por isso não aumenta o número de células
+    cubo = df.groupby(DIMENSOES, observed=True).agg(
+        sales_value=('sales_value', 'sum'),
+        quantity=('quantity', 'sum'),
+        rows=('sales_value', 'size'),
+        baskets=('basket_id', 'nunique'),
+    ).reset_index()
+
+    return cubo
+
+
+def merge(cubo, novo):
+    # Junta dois cubos (por exemplo, o da versão anterior e o de um lote novo)
+    if cubo is None:
+        return novo
+    cubo = pd.concat([cubo, novo], ignore_index=True)
+    return cubo.groupby(DIMENSOES, observed=True)[MEDIDAS].sum().reset_index()
+
+
+# Rollup diário: menos dimensões, mas com o dia, para responder a intervalos de datas.
+# Guardado ordenado por 'date', um intervalo é uma fatia contígua (pesquisa binária).
+# 'total_value' é quantidade x preço, a mesma medida dos KPIs da página inicial.
+DIMENSOES_DIA = ['date', 'store_id', 'product_department']
+MEDIDAS_DIA = ['sales_value', 'quantity', 'rows', 'total_value']
+
+
+def build_daily(df):
+    diario = df.assign(date=df['transaction_timestamp'].dt.normalize(),
+                       total_value=df['quantity'] * df['sales_value'])
+    return diario.groupby(DIMENSOES_DIA, observed=True).agg(
+        sales_value=('sales_value', 'sum'),
+        quantity=('quantity', 'sum'),
+        rows=('sales_value', 'size'),
+        total_value=('total_value', 'sum'),
+    ).reset_index()
+
+
+def merge_daily(diario, novo):
+    if diario is None:
+        return novo
+    diario = pd.concat([diario, novo], ignore_index=True)
+    return diario.groupby(DIMENSOES_DIA, observed=True)[MEDIDAS_DIA].sum().reset_index()
+
+
+def rollup(cubo, por, medidas=MEDIDAS, **filtros):
+    # Filtra o cubo (valor único ou lista de valores por dimensão) e soma as medidas pelas dimensões 'por'.
+    # Atenção: um cesto tem vários produtos, por isso 'baskets' só é exato quando não se soma
+    # sobre product_department/product_type.
+    for coluna, valor in filtros.items():
+        if isinstance(valor, (list, tuple, set, pd.Index)):
+            cubo = cubo[cubo[coluna].isin(valor)]
+        else:
+            cubo = cubo[cubo[coluna] == valor]
+
+    return cubo.groupby(por, observed=True)[list(medidas)].sum().reset_index()
@@ -0,0 +1,147 @@
+import hashlib
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+import plotly.io as pio
+
+from grocery import metrics, store
+
+# Cache de figuras partilhada por todas as sessões do processo. A chave é
+# (gráfico, versão dos dados, parâmetros do filtro), por isso uma nova versão dos dados
+# invalida as entradas sem ser preciso limpá-las. O valor é a própria figura, já
+# construída, para que um acerto não pague a conversão do JSON; o limite de memória
+# conta o tamanho do JSON de cada figura. As figuras em cache são partilhadas: quem as
+# usar não as deve alterar.
+#
+# Por baixo da memória há uma camada em disco, escrita pelo pré-cálculo offline
+# (python -m grocery.prerender): uma pasta por versão com o JSON de cada figura. Uma
+# figura que não está em memória é procurada no disco antes de ser calculada, por isso
+# depois de um deploy ou de uma nova versão o primeiro visitante não paga o cálculo.
+# O dashboard só lê esta camada; quem a escreve é o pré-cálculo.
+
+MAX_BYTES = int(float(os.environ.get('GROCERY_FIGURE_CACHE_MB', 64)) * 2 ** 20)
+DISK_DIR = store.STORE_DIR / 'figures'
+
+
+class FigureCache:
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, chave):
+        with self._lock:
+            valor = self._entradas.get(chave)
+            if valor is None:
+                self.misses += 1
+                return None
+            self._entradas.move_to_end(chave)
+            self.hits += 1
+            return valor[0]
+
+    def put(self, chave, valor, tamanho):
+        if tamanho > self.max_bytes:
+            return
+
+        with self._lock:
+            anterior = self._entradas.pop(chave, None)
+            if anterior is not None:
+                self._bytes -= anterior[1]
+            self._entradas[chave] = (valor, tamanho)
+            self._bytes += tamanho
+
+            # Remove as entradas menos usadas até caber no limite
+            while self._bytes > self.max_bytes:
+                _, (_, removido) = self._entradas.popitem(last=False)
+                self._bytes -= removido
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            pedidos = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / pedidos if pedidos else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entradas),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+
+_cache = FigureCache()
+
+
+def _parametros(params):
+    return tuple(sorted((k, str(v)) for k, v in params.items()))
+
+
+def _ficheiro(nome, versao, parametros):
+    resumo = hashlib.sha1(repr(parametros).encode()).hexdigest()[:16]
+    return DISK_DIR / f'{versao:06d}' / f'{nome}-{resumo}.json'
+
+
+def _ler_disco(nome, versao, parametros):
+    try:
+        return _ficheiro(nome, versao, parametros).read_text()
+    except OSError:
+        return None
+
+
+def save(nome, valor, versao, **params):
+    # Escreve o JSON de uma figura na camada em disco (ficheiro temporário + replace)
+    caminho = _ficheiro(nome, versao, _parametros(params))
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    tmp = caminho.with_suffix(f'.{os.getpid()}.tmp')
+    tmp.write_text(valor)
+    os.replace(tmp, caminho)
+    return caminho
+
+
+def prune(manter):
+    # Apaga as pastas das versões anteriores a 'manter'
+    removidas = []
+    for pasta in DISK_DIR.glob('[0-9]*'):
+        if pasta.is_dir() and int(pasta.name) < manter:
+            shutil.rmtree(pasta, ignore_errors=True)
+            removidas.append(pasta.name)
+    return removidas
+
+
+def figura(nome, construir, **params):
+    # 'construir' só é chamado quando a figura não está em cache; deve incluir a leitura dos dados
+    versao = store.ensure_ingested()
+    chave = (nome, versao, _parametros(params))
+
+    fig = _cache.get(chave)
+    if fig is not None:
+        with metrics.timed(f'cache_hit:{nome}'):
+            return fig
+
+    valor = _ler_disco(*chave)
+    if valor is not None:
+        with metrics.timed(f'disk_hit:{nome}'):
+            fig = pio.from_json(valor)
+        _cache.put(chave, fig, len(valor))
+        return fig
+
+    with metrics.timed(f'build:{nome}'):
+        fig = construir()
+    _cache.put(chave, fig, len(fig.to_json()))
+    return fig
+
+
+def stats():
+    return _cache.stats()
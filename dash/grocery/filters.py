@@ -0,0 +1,78 @@
+import streamlit as st
+
+from grocery import bitmaps, store
+
+# Filtro global de datas. O script principal (app.py) desenha-o uma vez na barra lateral,
+# à volta de todas as páginas; cada página lê o intervalo escolhido com period() e passa-o
+# às consultas (start/end). Sem intervalo (ou com o conjunto todo) as consultas usam o
+# cubo, como antes.
+#
+# Filtros cruzados: lojas, departamentos, faixas etárias, rendimento e dimensão do agregado,
+# também na barra lateral. selection() devolve-os como **filtros de grocery.queries, que os
+# resolvem com o índice de bitmaps (OR dentro de cada dimensão, AND entre dimensões).
+#
+# drill_down() não é global: é o seletor de vista (mensal ou detalhe com janela de dias)
+# de cada gráfico de evolução.
+
+CHAVE = 'periodo'
+
+ROTULOS = {
+    'store_id': 'Lojas',
+    'product_department': 'Departamentos',
+    'household_age': 'Faixas etárias',
+    'household_income': 'Rendimento',
+    'household_size': 'Dimensão do agregado',
+}
+
+
+def date_filter():
+    primeiro, ultimo = store.date_bounds()
+    st.sidebar.date_input('Período', value=(primeiro, ultimo), min_value=primeiro, max_value=ultimo,
+                          format='DD/MM/YYYY', key=CHAVE)
+
+
+def period():
+    # {'start': dia, 'end': dia} com os limites que de facto cortam os dados, ou {}
+    valor = st.session_state.get(CHAVE)
+    if not valor:
+        return {}
+
+    primeiro, ultimo = store.date_bounds()
+    filtro = {}
+    if valor[0] > primeiro:
+        filtro['start'] = valor[0]
+    # Enquanto só o primeiro dia está escolhido, o intervalo fica aberto até ao fim
+    if len(valor) > 1 and valor[1] < ultimo:
+        filtro['end'] = valor[1]
+    return filtro
+
+
+def drill_down(chave, periodo):
+    # Vista mensal (None) ou janela de dias (start, end) para os gráficos de detalhe ao dia
+    # ou à hora; a janela fica dentro do período global
+    vista = st.radio('Vista', ['Mensal', 'Detalhe'], horizontal=True, key=f'{chave}_vista')
+    if vista == 'Mensal':
+        return None
+
+    primeiro, ultimo = store.date_bounds()
+    primeiro, ultimo = periodo.get('start', primeiro), periodo.get('end', ultimo)
+    if primeiro >= ultimo:
+        return primeiro, ultimo
+    # Os limites fazem parte da chave: mudar o período global recomeça a janela
+    return st.slider('Janela', min_value=primeiro, max_value=ultimo, value=(primeiro, ultimo), format='DD/MM/YYYY',
+                     key=f'{chave}_janela_{primeiro}_{ultimo}')
+
+
+def _chave(coluna):
+    return f'filtro_{coluna}'
+
+
+def cross_filter():
+    with st.sidebar.expander('Filtros', expanded=False):
+        for coluna, rotulo in ROTULOS.items():
+            st.multiselect(rotulo, bitmaps.values(coluna), key=_chave(coluna))
+
+
+def selection():
+    # {coluna: [valores]} só das dimensões com alguma escolha
+    return {coluna: list(st.session_state[_chave(coluna)]) for coluna in ROTULOS if st.session_state.get(_chave(coluna))}
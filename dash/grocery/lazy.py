@@ -0,0 +1,151 @@
+import polars as pl
+
+from grocery import store
+
+# Backend Polars opcional: as mesmas agregações de grocery.queries, escritas como consultas
+# lazy sobre as partes Parquet da versão publicada. O plano só é executado no collect(),
+# por isso o Polars lê apenas as colunas usadas, aplica os filtros durante a leitura e
+# funde os passos (filtro, agregação, ordenação) num só, em paralelo por todos os núcleos
+# e sem as tabelas intermédias do pandas. Com um intervalo de dias (start/end) as consultas
+# correm sobre o rollup diário; os filtros cruzados (**filtros, os mesmos de
+# grocery.bitmaps) são condições is_in sobre as transações.
+#
+# As categorias são lidas como texto: cada parte tem o seu próprio dicionário.
+
+CATEGORICAS = ['product_type', 'product_department', 'household_age', 'household_income', 'household_size', 'period']
+
+
+def _ler(caminhos, colunas):
+    # Partes de versões antigas podem não ter as colunas mais recentes (ficam a nulo)
+    tabela = pl.scan_parquet(caminhos, missing_columns='insert', extra_columns='ignore').select(colunas)
+    return tabela.with_columns(pl.col(c).cast(pl.String) for c in colunas if c in CATEGORICAS)
+
+
+def _transacoes(colunas, loja=None):
+    # Os filtros por loja escolhem as partições logo à partida
+    partes = store.manifest()['parts']
+    ficheiros = [str(store.STORE_DIR / parte['path']) for parte in partes if loja is None or parte['store_id'] == loja]
+    return _ler(ficheiros, colunas)
+
+
+def _diario(colunas, start=None, end=None):
+    colunas = list(dict.fromkeys(colunas + ['date']))
+    diario = _ler(str(store.STORE_DIR / store.manifest()['daily']), colunas)
+    inicio, fim = store.day_range(start, end)
+    if inicio is not None:
+        diario = diario.filter(pl.col('date') >= inicio.to_pydatetime())
+    if fim is not None:
+        diario = diario.filter(pl.col('date') < fim.to_pydatetime())
+    return diario
+
+
+def _filtrar(tabela, filtros):
+    for coluna, valor in filtros.items():
+        valores = valor if isinstance(valor, (list, tuple, set)) else [valor]
+        tabela = tabela.filter(pl.col(coluna).is_in([str(v) if coluna in CATEGORICAS else v for v in valores]))
+    return tabela
+
+
+def _tabela(colunas, loja=None, start=None, end=None, filtros=None):
+    # Transações (com filtros cruzados ou sem intervalo) ou rollup diário com a coluna period
+    if filtros or (start is None and end is None):
+        colunas = list(dict.fromkeys(colunas + list(filtros or {})))
+        return _filtrar(_transacoes(colunas, loja), filtros or {})
+    tabela = _diario([c for c in colunas if c != 'period'], start, end)
+    return tabela.with_columns(period=pl.col('date').dt.strftime('%Y-%m'))
+
+
+def _pandas(consulta):
+    return consulta.collect().to_pandas()
+
+
+def period_totals(start=None, end=None):
+    diario = _diario(['store_id', 'rows', 'total_value'], start, end)
+    linha = diario.select(
+        sales=pl.col('total_value').sum(),
+        rows=pl.col('rows').sum(),
+        stores=pl.col('store_id').filter(pl.col('rows') > 0).unique().sort(),
+    ).collect()
+    return {'sales': float(linha['sales'][0]), 'rows': int(linha['rows'][0]),
+            'stores': linha['stores'].to_list()}
+
+
+def _soma(tabela, por, medidas):
+    return tabela.group_by(por).agg(pl.col(medida).sum() for medida in medidas)
+
+
+def _contagem(tabela, por):
+    return tabela.group_by(por).agg(rows=pl.len())
+
+
+def top_products(n=10, **filtros):
+    vendas = _soma(_tabela(['product_type', 'sales_value'], filtros=filtros), 'product_type', ['sales_value'])
+    return _pandas(vendas.top_k(n, by='sales_value'))
+
+
+def top_departments(n=11, **filtros):
+    vendas = _soma(_tabela(['product_department', 'sales_value'], filtros=filtros), 'product_department', ['sales_value'])
+    return _pandas(vendas.top_k(n, by='sales_value'))
+
+
+def department_month(top=3, start=None, end=None):
+    tabela = _tabela(['period', 'product_department', 'quantity', 'sales_value'], start=start, end=end)
+    vendas = _soma(tabela, ['period', 'product_department'], ['quantity', 'sales_value'])
+    melhores = _soma(vendas, 'product_department', ['sales_value']).top_k(top, by='sales_value').select('product_department')
+    return _pandas(vendas.join(melhores, on='product_department', how='semi').sort('period', 'product_department'))
+
+
+def store_period(start=None, end=None):
+    tabela = _tabela(['period', 'store_id', 'sales_value', 'quantity'], start=start, end=end)
+    return _pandas(_soma(tabela, ['period', 'store_id'], ['sales_value', 'quantity']).sort('period', 'store_id'))
+
+
+def _ordenar(tabela, coluna):
+    # Pela ordem conhecida das faixas (store.ORDENS), com os valores inesperados no fim
+    ordem = store.ORDENS[coluna]
+    return tabela.sort(pl.col(coluna).replace_strict(ordem, list(range(len(ordem))), default=len(ordem)), coluna)
+
+
+def age_counts(**filtros):
+    return _pandas(_ordenar(_contagem(_tabela(['household_age'], filtros=filtros), 'household_age'), 'household_age'))
+
+
+def income_counts(**filtros):
+    return _pandas(_ordenar(_contagem(_tabela(['household_income'], filtros=filtros), 'household_income'), 'household_income'))
+
+
+def _horas():
+    # Tabela de horas calculada na ingestão (loja x dia da semana x hora)
+    return pl.scan_parquet(str(store.STORE_DIR / store.manifest()['hours']))
+
+
+def hour_counts():
+    return _pandas(_soma(_horas(), 'hour', ['rows']).sort('hour'))
+
+
+def hour_weekday():
+    contagens = _pandas(_soma(_horas(), ['weekday', 'hour'], ['rows']))
+    return contagens.pivot(index='weekday', columns='hour', values='rows').sort_index()
+
+
+def hour_store():
+    contagens = _pandas(_soma(_horas(), ['store_id', 'hour'], ['rows']))
+    return contagens.pivot(index='store_id', columns='hour', values='rows').sort_index()
+
+
+def store_department(loja, **filtros):
+    tabela = _tabela(['store_id', 'product_department', 'sales_value'], loja=loja, filtros=filtros)
+    tabela = tabela.filter(pl.col('store_id') == loja)
+    return _pandas(_soma(tabela, 'product_department', ['sales_value']).sort('product_department'))
+
+
+def store_month(loja, start=None, end=None):
+    tabela = _tabela(['store_id', 'period', 'sales_value'], loja=loja, start=start, end=end)
+    tabela = tabela.filter(pl.col('store_id') == loja)
+    return _pandas(_soma(tabela, 'period', ['sales_value']).sort('period'))
+
+
+def age_department(faixas_etarias, **filtros):
+    tabela = _tabela(['household_age', 'product_department'], filtros=filtros)
+    tabela = tabela.filter(pl.col('household_age').is_in([str(faixa) for faixa in faixas_etarias]))
+    return _pandas(_contagem(tabela, ['household_age', 'product_department']).sort('household_age', 'product_department'))
@@ -0,0 +1,74 @@
+import argparse
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from grocery import metrics, store
+
+# Relatório de memória: bytes por coluna do conjunto de transações partilhado (ficheiros
+# Arrow mapeados) e, por processo, quanto é memória privada e quanto vem dos ficheiros
+# mapeados, que o sistema operativo partilha entre todos os processos do servidor.
+
+CAMPOS = {'Rss': 'rss_mb', 'Pss': 'pss_mb', 'Shared_Clean': 'shared_mb', 'Shared_Dirty': 'shared_mb',
+          'Private_Clean': 'private_mb', 'Private_Dirty': 'private_mb'}
+
+
+def columns(version=None):
+    tabela = store.shared(version=version)
+    linhas = [{'column': campo.name, 'type': str(campo.type), 'bytes': coluna.nbytes}
+              for campo, coluna in zip(tabela.schema, tabela.columns)]
+    colunas = pd.DataFrame(linhas, columns=['column', 'type', 'bytes'])
+    colunas['bytes_per_row'] = colunas['bytes'] / max(tabela.num_rows, 1)
+    return colunas.sort_values('bytes', ascending=False, ignore_index=True)
+
+
+def process(pid='self'):
+    # Valores em MB; sem /proc (fora de Linux) só há o RSS do próprio processo
+    pasta = Path('/proc') / str(pid)
+    resultado = {'pid': os.getpid() if pid == 'self' else int(pid), 'rss_mb': 0.0, 'pss_mb': 0.0,
+                 'shared_mb': 0.0, 'private_mb': 0.0, 'dataset_mb': 0.0}
+    try:
+        with open(pasta / 'smaps') as f:
+            mapeamento = ''
+            for linha in f:
+                partes = linha.split()
+                if not partes[0].endswith(':'):
+                    # Cabeçalho de um mapeamento: o caminho é a sexta coluna, se existir
+                    mapeamento = partes[5] if len(partes) > 5 else ''
+                    continue
+                campo = partes[0][:-1]
+                if campo in CAMPOS:
+                    resultado[CAMPOS[campo]] += int(partes[1]) / 1024
+                if campo == 'Rss' and mapeamento.endswith('.arrow') and mapeamento.startswith(str(store.STORE_DIR)):
+                    resultado['dataset_mb'] += int(partes[1]) / 1024
+    except OSError:
+        if pid == 'self':
+            resultado['rss_mb'] = metrics.rss_mb()
+    return {chave: round(valor, 1) if isinstance(valor, float) else valor for chave, valor in resultado.items()}
+
+
+def processes():
+    # Todos os processos do servidor Streamlit visíveis nesta máquina
+    linhas = []
+    for pasta in Path('/proc').glob('[0-9]*'):
+        try:
+            comando = (pasta / 'cmdline').read_bytes().replace(b'\0', b' ').decode(errors='replace').strip()
+        except OSError:
+            continue
+        if 'streamlit' in comando:
+            linhas.append({**process(pasta.name), 'command': comando[:80]})
+    return pd.DataFrame(linhas, columns=['pid', 'rss_mb', 'pss_mb', 'shared_mb', 'private_mb', 'dataset_mb', 'command'])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Memória usada pelo conjunto partilhado e pelos processos do servidor')
+    parser.parse_args()
+
+    pd.set_option('display.width', 160)
+    colunas = columns()
+    print(colunas.to_string(index=False))
+    print(f"Total: {colunas['bytes'].sum() / 2 ** 20:.1f} MB\n")
+
+    servidores = processes()
+    print(servidores.to_string(index=False) if len(servidores) else 'Nenhum processo do Streamlit encontrado')
@@ -0,0 +1,270 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Instrumentação dos reruns: tempo de leitura dos dados, de cada gráfico e de cada
+# st.plotly_chart. Os tempos do rerun atual aparecem num painel na barra lateral
+# (opcional: GROCERY_DEBUG=1 ou ?debug=1 no URL) e os percentis por página são
+# exportados para um ficheiro de métricas (Prometheus se terminar em .prom, JSON lines
+# se terminar em .jsonl).
+
+DEBUG = os.environ.get('GROCERY_DEBUG', '') not in ('', '0')
+METRICS_FILE = os.environ.get('GROCERY_METRICS_FILE')
+JANELA = 1000
+
+_local = threading.local()
+_lock = threading.Lock()
+_paginas = defaultdict(lambda: deque(maxlen=JANELA))
+_passos = defaultdict(lambda: deque(maxlen=JANELA))
+# Primeiro rerun completo de cada sessão (o que o utilizador espera até ver a página)
+_primeiras = deque(maxlen=JANELA)
+_arranque = {}
+
+
+def _inicio_processo():
+    # Momento em que o processo arrancou (segundos desde a época), lido do /proc quando existe
+    try:
+        with open('/proc/self/stat') as f:
+            ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/stat') as f:
+            boot = next(int(linha.split()[1]) for linha in f if linha.startswith('btime'))
+        return boot + ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, StopIteration):
+        return time.time()
+
+
+PROCESS_START = _inicio_processo()
+
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        # Sem /proc: usa o máximo do processo (KB em Linux, bytes em macOS)
+        import resource
+        maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maximo / 2 ** 20 if sys.platform == 'darwin' else maximo / 2 ** 10
+
+
+def _rerun():
+    return getattr(_local, 'rerun', None)
+
+
+def record(nome, segundos):
+    rerun = _rerun()
+    pagina = rerun['page'] if rerun else '-'
+    if rerun is not None:
+        rerun['steps'].append((nome, segundos))
+    with _lock:
+        _passos[(pagina, nome)].append(segundos)
+
+
+@contextmanager
+def timed(nome):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(nome, time.perf_counter() - inicio)
+
+
+def plotly_chart(nome, figura, destino=st, **kwargs):
+    # 'destino' permite desenhar num contentor ou placeholder (st.empty()) já criado
+    with timed(f'render:{nome}'):
+        return destino.plotly_chart(figura, **kwargs)
+
+
+def bind(funcao):
+    # Para correr noutra thread: os passos medidos lá contam para o rerun de quem a chamou
+    rerun = _rerun()
+
+    def executar(*args, **kwargs):
+        anterior = _rerun()
+        _local.rerun = rerun
+        try:
+            return funcao(*args, **kwargs)
+        finally:
+            _local.rerun = anterior
+    return executar
+
+
+def start_page(pagina):
+    # Arranque do processo: do início do processo até ao primeiro rerun
+    _arranque.setdefault('startup_s', time.time() - PROCESS_START)
+    _local.rerun = {'page': pagina, 'start': time.perf_counter(), 'steps': [], 'first': _primeiro_da_sessao()}
+
+
+def _primeiro_da_sessao():
+    try:
+        if st.session_state.get('_metrics_pintado'):
+            return False
+        st.session_state['_metrics_pintado'] = True
+        return True
+    except Exception:
+        # Fora do Streamlit (benchmarks, CLI) não há sessão
+        return False
+
+
+def end_page(painel=True):
+    rerun = _rerun()
+    if rerun is None:
+        return
+    _local.rerun = None
+
+    total = time.perf_counter() - rerun['start']
+    with _lock:
+        _paginas[rerun['page']].append(total)
+        if rerun['first']:
+            _primeiras.append(total)
+        # Primeira página servida pelo processo: do início do processo até ao fim desse rerun
+        _arranque.setdefault('first_paint_s', time.time() - PROCESS_START)
+
+    if painel and _debug_ativo():
+        debug_panel(rerun, total)
+    if METRICS_FILE:
+        export(METRICS_FILE, rerun, total)
+
+
+@contextmanager
+def fragment(nome):
+    # Um rerun parcial (st.fragment) só corre o fragmento: conta como uma "página" própria.
+    # Dentro de um rerun completo os passos ficam na página que o contém.
+    if _rerun() is not None:
+        yield
+        return
+    start_page(nome)
+    try:
+        yield
+    finally:
+        # Os fragmentos não podem escrever na barra lateral: sem painel de debug
+        end_page(painel=False)
+
+
+def _percentis(valores):
+    valores = np.fromiter(valores, dtype=float)
+    return float(np.percentile(valores, 50)), float(np.percentile(valores, 95))
+
+
+def summary():
+    with _lock:
+        paginas = {pagina: list(v) for pagina, v in _paginas.items()}
+        passos = {chave: list(v) for chave, v in _passos.items()}
+        primeiras = list(_primeiras)
+
+    resumo = {'rss_mb': round(rss_mb(), 1), 'startup': dict(_arranque), 'pages': {}, 'steps': {}}
+    if primeiras:
+        p50, p95 = _percentis(primeiras)
+        resumo['startup']['session_first_paint'] = {'count': len(primeiras), 'p50_s': p50, 'p95_s': p95}
+    for pagina, valores in paginas.items():
+        p50, p95 = _percentis(valores)
+        resumo['pages'][pagina] = {'count': len(valores), 'p50_s': p50, 'p95_s': p95}
+    for (pagina, nome), valores in passos.items():
+        p50, p95 = _percentis(valores)
+        resumo['steps'].setdefault(pagina, {})[nome] = {'count': len(valores), 'p50_s': p50, 'p95_s': p95}
+    return resumo
+
+
+def _prometheus(resumo):
+    from grocery import figcache, memory
+
+    linhas = ['# TYPE grocery_page_latency_seconds summary']
+    for pagina, m in resumo['pages'].items():
+        linhas.append(f'grocery_page_latency_seconds{{page="{pagina}",quantile="0.5"}} {m["p50_s"]:.6f}')
+        linhas.append(f'grocery_page_latency_seconds{{page="{pagina}",quantile="0.95"}} {m["p95_s"]:.6f}')
+        linhas.append(f'grocery_page_latency_seconds_count{{page="{pagina}"}} {m["count"]}')
+    linhas.append('# TYPE grocery_step_latency_seconds summary')
+    for pagina, passos in resumo['steps'].items():
+        for nome, m in passos.items():
+            rotulos = f'page="{pagina}",step="{nome}"'
+            linhas.append(f'grocery_step_latency_seconds{{{rotulos},quantile="0.5"}} {m["p50_s"]:.6f}')
+            linhas.append(f'grocery_step_latency_seconds{{{rotulos},quantile="0.95"}} {m["p95_s"]:.6f}')
+            linhas.append(f'grocery_step_latency_seconds_count{{{rotulos}}} {m["count"]}')
+    arranque = resumo['startup']
+    if 'startup_s' in arranque:
+        linhas.append('# TYPE grocery_process_startup_seconds gauge')
+        linhas.append(f'grocery_process_startup_seconds {arranque["startup_s"]:.6f}')
+    if 'first_paint_s' in arranque:
+        linhas.append('# TYPE grocery_process_first_paint_seconds gauge')
+        linhas.append(f'grocery_process_first_paint_seconds {arranque["first_paint_s"]:.6f}')
+    if 'session_first_paint' in arranque:
+        m = arranque['session_first_paint']
+        linhas.append('# TYPE grocery_session_first_paint_seconds summary')
+        linhas.append(f'grocery_session_first_paint_seconds{{quantile="0.5"}} {m["p50_s"]:.6f}')
+        linhas.append(f'grocery_session_first_paint_seconds{{quantile="0.95"}} {m["p95_s"]:.6f}')
+        linhas.append(f'grocery_session_first_paint_seconds_count {m["count"]}')
+    linhas.append('# TYPE grocery_process_resident_memory_bytes gauge')
+    linhas.append(f'grocery_process_resident_memory_bytes {int(resumo["rss_mb"] * 2 ** 20)}')
+    processo = memory.process()
+    linhas.append('# TYPE grocery_process_memory_bytes gauge')
+    for tipo in ['private', 'shared', 'dataset']:
+        linhas.append(f'grocery_process_memory_bytes{{kind="{tipo}"}} {int(processo[f"{tipo}_mb"] * 2 ** 20)}')
+
+    cache = figcache.stats()
+    linhas.append('# TYPE grocery_figure_cache_hits_total counter')
+    linhas.append(f'grocery_figure_cache_hits_total {cache["hits"]}')
+    linhas.append('# TYPE grocery_figure_cache_misses_total counter')
+    linhas.append(f'grocery_figure_cache_misses_total {cache["misses"]}')
+    return '\n'.join(linhas) + '\n'
+
+
+def export(caminho, rerun=None, total=None):
+    caminho = Path(caminho)
+    resumo = summary()
+    if caminho.suffix == '.jsonl':
+        # Uma linha por rerun, com os percentis acumulados da página
+        linha = {'ts': time.time(), 'rss_mb': resumo['rss_mb']}
+        if rerun is not None:
+            linha.update(page=rerun['page'], total_s=total, steps=dict(rerun['steps']), first=rerun['first'],
+                         **{k: v for k, v in resumo['pages'][rerun['page']].items() if k != 'count'})
+        with _lock, open(caminho, 'a') as f:
+            f.write(json.dumps(linha) + '\n')
+    else:
+        # Fotografia atual no formato de texto do Prometheus, substituída atomicamente
+        tmp = caminho.with_suffix(caminho.suffix + '.tmp')
+        tmp.write_text(_prometheus(resumo))
+        os.replace(tmp, caminho)
+
+
+def _debug_ativo():
+    try:
+        return DEBUG or st.query_params.get('debug') == '1'
+    except Exception:
+        return DEBUG
+
+
+def debug_panel(rerun, total):
+    from grocery import figcache, memory
+
+    with st.sidebar.expander('Debug: desempenho', expanded=True):
+        st.caption(f"Rerun de '{rerun['page']}': {total * 1000:.0f} ms · RSS {rss_mb():.0f} MB")
+        processo = memory.process()
+        if processo['pss_mb']:
+            st.caption(f"Memória: {processo['private_mb']:.0f} MB privada, {processo['shared_mb']:.0f} MB partilhada "
+                       f"({processo['dataset_mb']:.0f} MB dos ficheiros Arrow mapeados)")
+        if rerun['steps']:
+            passos = pd.DataFrame(rerun['steps'], columns=['passo', 'segundos'])
+            st.dataframe(passos.style.format({'segundos': '{:.4f}'}), hide_index=True)
+
+        arranque = summary()['startup']
+        if 'first_paint_s' in arranque:
+            st.caption(f"Processo: primeiro rerun aos {arranque['startup_s']:.1f} s, "
+                       f"primeira página servida aos {arranque['first_paint_s']:.1f} s")
+
+        resumo = summary()['pages']
+        if resumo:
+            st.caption('Latência por página')
+            st.dataframe(pd.DataFrame(resumo).T, use_container_width=True)
+
+        cache = figcache.stats()
+        st.caption(f"Cache de figuras: {cache['hits']} hits, {cache['misses']} misses, "
+                   f"{cache['entries']} entradas, {cache['bytes'] / 2 ** 20:.1f} MB")
@@ -0,0 +1,109 @@
+import argparse
+import sys
+import time
+
+import pandas as pd
+
+from grocery import queries, store
+
+# Verificação de paridade entre backends: corre cada agregação de grocery.queries (a
+# referência, em pandas) e a mesma função de outro backend sobre a versão publicada,
+# com e sem intervalo de dias e filtros cruzados, e compara os resultados:
+#
+#   python -m grocery.parity --backend polars duckdb
+#
+# A ordem das linhas e os tipos (categorias, inteiros/decimais) não contam, só os
+# valores. Termina com código 1 quando algum resultado é diferente.
+
+CHAVES = ['period', 'store_id', 'product_type', 'product_department', 'household_age', 'household_income',
+          'household_size', 'weekday', 'hour']
+
+
+def chamadas():
+    # (nome da função, argumentos) a comparar
+    lojas = store.stores()
+    faixas = queries.age_counts()['household_age'].astype(str).tolist()
+    primeiro, ultimo = store.date_bounds()
+    inicio = primeiro + (ultimo - primeiro) // 3
+    fim = primeiro + 2 * (ultimo - primeiro) // 3
+    intervalo = {'start': inicio, 'end': fim}
+    filtros = {'store_id': lojas[:2], 'household_age': faixas[1:4]}
+
+    yield 'period_totals', {}
+    yield 'period_totals', intervalo
+    for nome in ('top_products', 'top_departments', 'age_counts', 'income_counts'):
+        yield nome, {}
+        yield nome, filtros
+    for nome in ('department_month', 'store_period'):
+        yield nome, {}
+        yield nome, intervalo
+    for nome in ('hour_counts', 'hour_weekday', 'hour_store'):
+        yield nome, {}
+    for loja in lojas:
+        yield 'store_department', {'loja': loja}
+        yield 'store_month', {'loja': loja}
+    yield 'store_department', {'loja': lojas[0], 'household_age': faixas[:2]}
+    yield 'store_month', {'loja': lojas[-1], **intervalo}
+    yield 'age_department', {'faixas_etarias': faixas[:2]}
+    yield 'age_department', {'faixas_etarias': faixas[:2], 'store_id': lojas[0]}
+
+
+def _normalizar(resultado):
+    # Tabela com as chaves como texto, as medidas como decimais e as linhas ordenadas pelas chaves
+    if isinstance(resultado, dict):
+        return resultado
+    if not isinstance(resultado.index, pd.RangeIndex):
+        resultado = resultado.reset_index()
+    resultado = resultado.rename(columns=str)
+    chaves = [coluna for coluna in resultado.columns if coluna in CHAVES]
+    tabela = pd.DataFrame({coluna: resultado[coluna].astype(str) if coluna in chaves else resultado[coluna].astype('float64')
+                           for coluna in sorted(resultado.columns)})
+    return tabela.sort_values(chaves).reset_index(drop=True)
+
+
+def comparar(referencia, outro):
+    # None quando são iguais; senão a descrição da diferença
+    referencia, outro = _normalizar(referencia), _normalizar(outro)
+    if isinstance(referencia, dict):
+        if referencia.keys() != outro.keys() or referencia['stores'] != outro['stores'] or referencia['rows'] != outro['rows'] \
+                or abs(referencia['sales'] - outro['sales']) > 1e-6 * max(abs(referencia['sales']), 1):
+            return f"{referencia} != {outro}"
+        return None
+    try:
+        pd.testing.assert_frame_equal(referencia, outro, check_exact=False, rtol=1e-9)
+    except AssertionError as erro:
+        return str(erro)
+    return None
+
+
+def run(backends):
+    referencia = queries.backend('pandas')
+    outros = {nome: queries.backend(nome) for nome in backends}
+    diferencas, tempos = [], {nome: 0.0 for nome in ['pandas'] + list(backends)}
+
+    for nome, argumentos in chamadas():
+        inicio = time.perf_counter()
+        esperado = getattr(referencia, nome)(**argumentos)
+        tempos['pandas'] += time.perf_counter() - inicio
+        for backend, modulo in outros.items():
+            inicio = time.perf_counter()
+            obtido = getattr(modulo, nome)(**argumentos)
+            tempos[backend] += time.perf_counter() - inicio
+            diferenca = comparar(esperado, obtido)
+            if diferenca is not None:
+                diferencas.append((backend, nome, argumentos, diferenca))
+    return diferencas, tempos
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compara os backends das agregações com a referência em pandas')
+    parser.add_argument('--backend', nargs='+', default=['polars'], choices=['duckdb', 'polars'])
+    args = parser.parse_args()
+
+    store.ensure_ingested()
+    diferencas, tempos = run(args.backend)
+    for backend, nome, argumentos, diferenca in diferencas:
+        print(f"DIFERENTE {backend}.{nome}({argumentos}):\n{diferenca}\n")
+    print(', '.join(f"{backend} {segundos:.3f}s" for backend, segundos in tempos.items()))
+    print(f"{len(diferencas)} diferenças" if diferencas else "Sem diferenças")
+    sys.exit(1 if diferencas else 0)
@@ -0,0 +1,74 @@
+import pandas as pd
+import streamlit as st
+
+from grocery import cube, store
+
+# Rollups de calendário por loja e departamento: dia, semana (de segunda a domingo), mês,
+# trimestre e ano, calculados uma vez por versão a partir do rollup diário (sem voltar às
+# transações). A coluna 'date' é o primeiro dia de cada período, por isso meses de anos
+# diferentes nunca se juntam.
+#
+# compare() junta a cada período o valor do período anterior ou do período homólogo do
+# ano anterior com um único merge (os períodos são deslocados em bloco, sem ciclos).
+
+GRAINS = {'day': 'D', 'week': 'W', 'month': 'M', 'quarter': 'Q', 'year': 'Y'}
+
+# Períodos até ao homólogo do ano anterior: 52 semanas e 364 dias mantêm o dia da semana
+PERIODOS_POR_ANO = {'day': 364, 'week': 52, 'month': 12, 'quarter': 4, 'year': 1}
+
+MEDIDAS = cube.MEDIDAS_DIA
+
+
+def month_labels(periodos, nomes):
+    # 'AAAA-MM' -> nome do mês, com o ano quando os períodos cobrem mais de um ano
+    periodos = [str(p) for p in periodos]
+    varios_anos = len({p[:4] for p in periodos}) > 1
+    return [nomes[int(p[5:7]) - 1] + (f' {p[:4]}' if varios_anos else '') for p in periodos]
+
+
+def months(periodos):
+    # Todos os meses ('AAAA-MM') de janeiro do primeiro ano a dezembro do último
+    anos = sorted({str(p)[:4] for p in periodos})
+    if not anos:
+        return []
+    return pd.period_range(f'{anos[0]}-01', f'{anos[-1]}-12', freq='M').strftime('%Y-%m').tolist()
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _calendario(versao, grain):
+    diario = store.load_daily(version=versao)
+    inicio = diario['date'].dt.to_period(GRAINS[grain]).dt.start_time
+    return diario.assign(date=inicio).groupby(['date', 'store_id', 'product_department'], observed=True)[MEDIDAS].sum().reset_index()
+
+
+def rollup(grain='month', por=(), start=None, end=None, **filtros):
+    # Medidas por período (e pelas dimensões 'por'); start/end são dias e escolhem os períodos que começam no intervalo
+    if grain not in GRAINS:
+        raise ValueError(f"Período desconhecido: {grain}")
+    tabela = _calendario(store.ensure_ingested(), grain)
+    if start is not None or end is not None:
+        i, j = store.search_range(tabela['date'].to_numpy(), start, end)
+        tabela = tabela.iloc[i:j]
+    por = [por] if isinstance(por, str) else list(por)
+    return cube.rollup(tabela, ['date'] + por, MEDIDAS, **filtros)
+
+
+def compare(grain='month', por=(), medida='sales_value', against='year', start=None, end=None, **filtros):
+    # Uma linha por período: valor, valor de comparação ('year' = homólogo, 'previous' = período
+    # anterior), diferença e variação relativa. Sem dados no período de comparação fica NaN.
+    por = [por] if isinstance(por, str) else list(por)
+    atual = rollup(grain, por, **filtros)[['date'] + por + [medida]]
+
+    desfasamento = PERIODOS_POR_ANO[grain] if against == 'year' else 1
+    anterior = atual.rename(columns={medida: 'previous'})
+    anterior['date'] = (anterior['date'].dt.to_period(GRAINS[grain]) + desfasamento).dt.start_time
+
+    resultado = atual.merge(anterior, on=['date'] + por, how='left')
+    resultado['delta'] = resultado[medida] - resultado['previous']
+    resultado['delta_pct'] = (resultado['delta'] / resultado['previous']).where(resultado['previous'] != 0)
+
+    # A comparação usa o histórico todo; o intervalo só escolhe os períodos mostrados
+    if start is not None or end is not None:
+        i, j = store.search_range(resultado['date'].to_numpy(), start, end)
+        resultado = resultado.iloc[i:j]
+    return resultado.reset_index(drop=True)
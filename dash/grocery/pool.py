@@ -0,0 +1,78 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from streamlit.runtime.scriptrunner_utils.script_run_context import SCRIPT_RUN_CONTEXT_ATTR_NAME
+
+from grocery import metrics
+
+# Cálculo concorrente dos gráficos de uma página. Cada gráfico é calculado numa thread
+# de um pool partilhado por todas as sessões (tamanho GROCERY_WORKERS) e desenhado no
+# seu placeholder assim que fica pronto, pela ordem em que terminam. A thread do script
+# é a única que escreve na página.
+#
+# Threads e não processos: os dados (cubo, cestos, figuras) estão em cache na memória
+# do processo e as agregações do pandas/numpy/DuckDB libertam o GIL na maior parte do
+# tempo. Com GROCERY_WORKERS=0 ou 1 (omissão) os gráficos são calculados em sequência.
+
+WORKERS = int(os.environ.get('GROCERY_WORKERS', 0))
+
+_lock = threading.Lock()
+_executor = None
+
+
+def _pool():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='grocery-chart')
+        return _executor
+
+
+def _na_thread(funcao, ctx):
+    funcao = metrics.bind(funcao)
+
+    def executar():
+        # Contexto da sessão, para que as caches do Streamlit funcionem sem avisos. As threads
+        # do pool servem todas as sessões: no fim volta ao contexto anterior (normalmente
+        # nenhum), para que a tarefa seguinte não corra com a sessão desta
+        thread = threading.current_thread()
+        anterior = get_script_run_ctx(suppress_warning=True)
+        if ctx is not None:
+            add_script_run_ctx(thread, ctx)
+        try:
+            return funcao()
+        finally:
+            setattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME, anterior)
+    return executar
+
+
+class ChartBatch:
+    def __init__(self):
+        self._graficos = []
+        self._futuros = None
+
+    def add(self, nome, destino, construir, **kwargs):
+        # 'destino' é o placeholder onde o gráfico vai ser desenhado; 'construir' devolve a figura
+        self._graficos.append((nome, destino, construir, kwargs))
+        return self
+
+    def start(self):
+        # Lança os cálculos; a página pode continuar a desenhar outras coisas entretanto
+        if WORKERS > 1 and self._futuros is None:
+            ctx = get_script_run_ctx()
+            self._futuros = {_pool().submit(_na_thread(construir, ctx)): (nome, destino, kwargs)
+                             for nome, destino, construir, kwargs in self._graficos}
+        return self
+
+    def render(self):
+        self.start()
+        if self._futuros is None:
+            for nome, destino, construir, kwargs in self._graficos:
+                metrics.plotly_chart(nome, construir(), destino=destino, **kwargs)
+            return
+
+        for futuro in as_completed(self._futuros):
+            nome, destino, kwargs = self._futuros[futuro]
+            metrics.plotly_chart(nome, futuro.result(), destino=destino, **kwargs)
@@ -0,0 +1,155 @@
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from grocery import figcache, products, queries, store
+
+# Pré-cálculo offline das figuras mais vistas, para correr depois de cada ingestão ou
+# lote acrescentado:
+#
+#   python -m grocery.prerender
+#
+# Enumera as combinações de parâmetros que as páginas pedem por omissão (cada loja nos
+# gráficos de vendas e nos boxplots, o par de faixas etárias inicial, ...), calcula as
+# agregações e as figuras num pool de processos e escreve o JSON de cada uma na camada
+# em disco de grocery.figcache, que o dashboard serve diretamente.
+#
+# Os nomes e os parâmetros têm de ser os mesmos que as páginas passam a figcache.figura,
+# senão o dashboard não encontra as figuras.
+
+WORKERS = int(os.environ.get('GROCERY_PRERENDER_WORKERS', os.cpu_count() or 1))
+
+TODAS = 'Todas as lojas'
+
+_construtores = None
+
+
+def _figuras():
+    # (nome, parâmetros) das vistas por omissão de cada página, sem filtros na barra lateral
+    q = queries.backend()
+    lojas = store.stores()
+
+    yield 'app.grafico_8', {}
+    yield 'app.grafico_9', {}
+    yield 'app.grafico_10', {}
+
+    yield 'first_page.grafico_12', {}
+    yield 'first_page.grafico_13', {}
+    for por in (None, 'weekday', 'store_id'):
+        yield 'first_page.grafico_7', {'start_hour': 8, 'end_hour': 22, 'por': por}
+
+    yield 'second_page.grafico_10', {}
+    yield 'second_page.grafico_4', {'loja': None}
+    for loja in [TODAS] + [str(loja) for loja in lojas]:
+        if loja != TODAS:
+            yield 'second_page.grafico_4', {'loja': loja}
+        yield 'second_page.grafico_14', {'loja': loja}
+        yield 'second_page.grafico_15', {'loja': loja}
+
+    for loja in lojas:
+        yield 'third_page.grafico1', {'loja': loja}
+        yield 'third_page.grafico2', {'loja': loja}
+        yield 'third_page.grafico5', {'loja': loja, 'agregacao': 'Mês', 'comparar_com': 'Ano anterior'}
+    yield 'third_page.grafico3', {'faixas': store.AGE_ORDER[:2]}
+
+    yield 'fourth_page.grafico_1', {'posicao': 1}
+    # O detalhe mostra por omissão o produto mais vendido
+    for produto in products.top(1)['product_type'].astype(str):
+        yield 'fourth_page.grafico_2', {'produto': produto}
+        yield 'fourth_page.grafico_3', {'produto': produto}
+        yield 'fourth_page.grafico_4', {'produto': produto}
+
+
+def _carregar():
+    # As mesmas chamadas que as páginas fazem dentro de figcache.figura
+    import app
+    from grocery import baskets, boxstats, periods
+    from pages import first_page, fourth_page, second_page, third_page
+
+    q = queries.backend()
+
+    def filtros_loja(loja):
+        return {} if loja == TODAS else {'store_id': next(l for l in store.stores() if str(l) == loja)}
+
+    def boxplot(loja):
+        resumos = boxstats.por_loja()
+        if loja is None:
+            return second_page.grafico_4(resumos)
+        return second_page.grafico_4({l: resumo for l, resumo in resumos.items() if str(l) == loja})
+
+    def histograma(loja):
+        filtros = filtros_loja(loja)
+        return second_page.grafico_14(baskets.histogram(**filtros), baskets.percentiles((0.25, 0.5, 0.75, 0.9), **filtros))
+
+    def horas(start_hour, end_hour, por):
+        contagens = {None: q.hour_counts, 'weekday': q.hour_weekday, 'store_id': q.hour_store}[por]
+        return first_page.grafico_7(contagens(), start_hour, end_hour, por)
+
+    return {
+        'app.grafico_8': lambda: app.grafico_8(q.top_products(10)),
+        'app.grafico_9': lambda: app.grafico_9(q.top_departments(11)),
+        'app.grafico_10': lambda: app.grafico_10(q.department_month(3)),
+        'first_page.grafico_12': lambda: first_page.grafico_12(first_page.preparar_dados(q.age_counts())),
+        'first_page.grafico_13': lambda: first_page.grafico_13(q.income_counts()),
+        'first_page.grafico_7': horas,
+        'second_page.grafico_10': lambda: second_page.grafico_10(q.store_period()),
+        'second_page.grafico_4': boxplot,
+        'second_page.grafico_14': histograma,
+        'second_page.grafico_15': lambda loja: second_page.grafico_15(baskets.mean_by('household_age', **filtros_loja(loja))),
+        'third_page.grafico1': lambda loja: third_page.grafico1(q.store_department(loja), loja),
+        'third_page.grafico2': lambda loja: third_page.grafico2(q.store_month(loja), loja),
+        'third_page.grafico3': lambda faixas: third_page.grafico3(q.age_department(faixas), faixas),
+        'third_page.grafico5': lambda loja, agregacao, comparar_com: third_page.grafico5(
+            periods.compare(third_page.AGREGACOES[agregacao], against=third_page.COMPARACOES[comparar_com], store_id=loja), comparar_com),
+        'fourth_page.grafico_1': lambda posicao: fourth_page.grafico_1(
+            products.top(fourth_page.POSICOES, posicao - 1),
+            f'Produtos mais vendidos ({posicao}.º a {posicao + fourth_page.POSICOES - 1}.º)'),
+        'fourth_page.grafico_2': lambda produto: fourth_page.grafico_2(products.breakdown(produto, 'period'), produto),
+        'fourth_page.grafico_3': lambda produto: fourth_page.grafico_3(products.breakdown(produto, 'store_id'), produto),
+        'fourth_page.grafico_4': lambda produto: fourth_page.grafico_4(products.breakdown(produto, 'household_age'), produto),
+    }
+
+
+def _renderizar(nome, params, versao):
+    # Corre num processo do pool; os dados e as páginas são carregados uma vez por processo
+    global _construtores
+    if _construtores is None:
+        _construtores = _carregar()
+
+    inicio = time.perf_counter()
+    figura = _construtores[nome](**params)
+    figcache.save(nome, figura.to_json(), versao, **params)
+    return time.perf_counter() - inicio
+
+
+def run(workers=WORKERS, prune=True):
+    versao = store.ensure_ingested()
+    figuras = list(_figuras())
+    tempos = []
+
+    # 'spawn': cada processo começa limpo, sem as threads (DuckDB, Streamlit) do processo principal
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=max(workers, 1), mp_context=contexto) as executor:
+        futuros = {executor.submit(_renderizar, nome, params, versao): (nome, params) for nome, params in figuras}
+        for futuro in as_completed(futuros):
+            nome, params = futuros[futuro]
+            tempos.append((nome, params, futuro.result()))
+
+    removidas = figcache.prune(versao) if prune else []
+    return versao, tempos, removidas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Pré-calcula as figuras mais vistas da versão publicada')
+    parser.add_argument('--workers', type=int, default=WORKERS, help='Processos do pool')
+    parser.add_argument('--keep-old', action='store_true', help='Não apagar as figuras das versões anteriores')
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    versao, tempos, removidas = run(args.workers, prune=not args.keep_old)
+    for nome, params, segundos in sorted(tempos, key=lambda t: -t[2]):
+        print(f"{nome} {params}: {segundos:.3f}s")
+    print(f"{len(tempos)} figuras da versão {versao} em {time.perf_counter() - inicio:.1f}s"
+          + (f"; versões removidas: {', '.join(removidas)}" if removidas else ''))
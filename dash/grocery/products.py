@@ -0,0 +1,177 @@
+import os
+import re
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from grocery import cube, metrics, store
+
+# Ranking de produtos para catálogos grandes, calculado uma vez por versão a partir do
+# cubo. Guarda:
+#   - o ranking global (códigos dos produtos por vendas decrescentes) e a posição de cada
+#     produto, por isso uma página do ranking, incluindo a cauda longa, é uma fatia;
+#   - os TOP_K produtos de cada loja, mês, faixa etária e departamento, já ordenados;
+#   - as vendas de cada produto por loja, mês e faixa etária, ordenadas por produto (o
+#     detalhe de um produto é uma fatia contígua, encontrada por pesquisa binária);
+#   - um índice de pesquisa por prefixo: o nome de cada produto a partir de cada palavra,
+#     em minúsculas e ordenado, por isso 'beef' encontra 'BEEF' e 'FRZN BEEF'.
+#
+# Rankings mais fundos do que TOP_K numa dimensão são calculados sobre o cubo.
+
+TOP_K = int(os.environ.get('GROCERY_TOP_K', 100))
+
+DIMENSOES = ['store_id', 'period', 'household_age', 'product_department']
+DETALHES = ['store_id', 'period', 'household_age']
+MEDIDAS = ['sales_value', 'quantity', 'rows']
+
+_FIM = chr(0x10FFFF)
+
+
+def _palavras(nome):
+    # O nome a partir do início de cada palavra
+    texto = str(nome).lower()
+    return [texto[m.start():] for m in re.finditer(r'(?<!\w)\w', texto)] or [texto]
+
+
+def _pesquisa(produtos):
+    chaves, codigos = [], []
+    for codigo, nome in enumerate(produtos):
+        for chave in _palavras(nome):
+            chaves.append(chave)
+            codigos.append(codigo)
+    chaves = np.array(chaves, dtype=object)
+    ordem = np.argsort(chaves, kind='stable')
+    return chaves[ordem], np.array(codigos, dtype=np.int64)[ordem]
+
+
+def _por_produto(cubo, codigos, coluna, n):
+    # Medidas por (produto, valor da dimensão), ordenadas por produto, e o início das linhas de cada produto
+    tabela = cubo.groupby([codigos, cubo[coluna]], observed=True)[MEDIDAS].sum().reset_index()
+    return tabela, np.searchsorted(tabela['codigo'].to_numpy(), np.arange(n + 1))
+
+
+def _melhores(cubo, codigos, coluna):
+    # Os TOP_K produtos de cada valor da dimensão, por vendas decrescentes, e o início das linhas de cada valor
+    tabela = cubo.groupby([cubo[coluna].cat.codes.rename('valor'), codigos], observed=True)[MEDIDAS].sum().reset_index()
+    tabela = tabela.sort_values(['valor', 'sales_value'], ascending=[True, False], kind='stable')
+    tabela = tabela.groupby('valor').head(TOP_K).reset_index(drop=True)
+    return tabela, np.searchsorted(tabela['valor'].to_numpy(), np.arange(len(cubo[coluna].cat.categories) + 1))
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _indice(versao):
+    with metrics.timed('load:products'):
+        cubo = store.load_cube(version=versao)
+        tipo = cubo['product_type'].dtype
+        n = len(tipo.categories)
+        codigos = pd.Series(cubo['product_type'].cat.codes.to_numpy(np.int64), index=cubo.index, name='codigo')
+
+        totais = {medida: np.bincount(codigos, weights=cubo[medida], minlength=n) for medida in MEDIDAS}
+        totais['quantity'] = totais['quantity'].astype(np.int64)
+        totais['rows'] = totais['rows'].astype(np.int64)
+        departamentos = np.full(n, -1, dtype=np.int64)
+        departamentos[codigos.to_numpy()] = cubo['product_department'].cat.codes.to_numpy()
+        ranking = np.argsort(-totais['sales_value'], kind='stable')
+        posicao = np.empty(n, dtype=np.int64)
+        posicao[ranking] = np.arange(1, n + 1)
+
+        chaves, codigos_pesquisa = _pesquisa(tipo.categories)
+        return {
+            'tipos': {coluna: cubo[coluna].dtype for coluna in DIMENSOES + ['product_type']},
+            'totais': totais,
+            'departamentos': departamentos,
+            'ranking': ranking,
+            'posicao': posicao,
+            'melhores': {coluna: _melhores(cubo, codigos, coluna) for coluna in DIMENSOES},
+            'detalhes': {coluna: _por_produto(cubo, codigos, coluna, n) for coluna in DETALHES},
+            'chaves': chaves,
+            'codigos': codigos_pesquisa,
+        }
+
+
+def _atual():
+    return _indice(store.ensure_ingested())
+
+
+def _tabela(indice, codigos, medidas=None, inicio=None):
+    # Uma linha por produto: posição no ranking (global, ou a partir de 'inicio' num ranking
+    # filtrado), nome, departamento e medidas
+    codigos = np.asarray(codigos, dtype=np.int64)
+    medidas = medidas or {medida: valores[codigos] for medida, valores in indice['totais'].items()}
+    return pd.DataFrame({
+        'rank': indice['posicao'][codigos] if inicio is None else np.arange(inicio, inicio + len(codigos)),
+        'product_type': pd.Categorical.from_codes(codigos, dtype=indice['tipos']['product_type']),
+        'product_department': pd.Categorical.from_codes(indice['departamentos'][codigos],
+                                                        dtype=indice['tipos']['product_department']),
+        **medidas,
+    })
+
+
+def values(coluna):
+    return _atual()['tipos'][coluna].categories.tolist()
+
+
+def size():
+    return len(_atual()['ranking'])
+
+
+def top(n=10, offset=0, **filtro):
+    # Produtos mais vendidos, da posição offset em diante; no máximo um filtro (dimensão=valor)
+    indice = _atual()
+    if not filtro:
+        return _tabela(indice, indice['ranking'][offset:offset + n])
+
+    if len(filtro) > 1:
+        raise ValueError("Só é possível filtrar o ranking por uma dimensão")
+    (coluna, valor), = filtro.items()
+    if coluna not in DIMENSOES:
+        raise ValueError(f"Dimensão desconhecida: {coluna}")
+    if offset + n > TOP_K:
+        vendas = cube.rollup(store.load_cube(), 'product_type', MEDIDAS, **filtro)
+        vendas = vendas.nlargest(offset + n, 'sales_value').iloc[offset:]
+        return _tabela(indice, vendas['product_type'].cat.codes, {medida: vendas[medida].to_numpy() for medida in MEDIDAS},
+                       offset + 1)
+
+    tabela, limites = indice['melhores'][coluna]
+    codigo = indice['tipos'][coluna].categories.get_indexer([valor])[0]
+    if codigo < 0:
+        return _tabela(indice, [], inicio=offset + 1)
+    linhas = tabela.iloc[limites[codigo] + offset:min(limites[codigo] + offset + n, limites[codigo + 1])]
+    return _tabela(indice, linhas['codigo'], {medida: linhas[medida].to_numpy() for medida in MEDIDAS}, offset + 1)
+
+
+def departments(n=11):
+    # Departamentos mais vendidos, somados a partir dos totais por produto
+    indice = _atual()
+    vendas = np.bincount(indice['departamentos'], weights=indice['totais']['sales_value'],
+                         minlength=len(indice['tipos']['product_department'].categories))
+    ordem = np.argsort(-vendas, kind='stable')[:n]
+    ordem = ordem[vendas[ordem] > 0]
+    return pd.DataFrame({
+        'product_department': pd.Categorical.from_codes(ordem, dtype=indice['tipos']['product_department']),
+        'sales_value': vendas[ordem],
+    })
+
+
+def search(texto, limit=20):
+    # Produtos com uma palavra começada por 'texto' (sem distinguir maiúsculas), os mais vendidos primeiro
+    indice = _atual()
+    texto = texto.strip().lower()
+    if not texto:
+        return _tabela(indice, [])
+    i = np.searchsorted(indice['chaves'], texto, side='left')
+    j = np.searchsorted(indice['chaves'], texto + _FIM, side='left')
+    encontrados = np.unique(indice['codigos'][i:j])
+    encontrados = encontrados[np.argsort(indice['posicao'][encontrados])][:limit]
+    return _tabela(indice, encontrados)
+
+
+def breakdown(produto, por):
+    # Vendas de um produto por loja, mês ou faixa etária
+    indice = _atual()
+    tabela, limites = indice['detalhes'][por]
+    codigo = indice['tipos']['product_type'].categories.get_indexer([produto])[0]
+    if codigo < 0:
+        return tabela.iloc[0:0].drop(columns='codigo')
+    return tabela.iloc[limites[codigo]:limites[codigo + 1]].drop(columns='codigo').reset_index(drop=True)
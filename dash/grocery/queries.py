@@ -0,0 +1,128 @@
+import os
+import sys
+
+from grocery import bitmaps, cube, products, store
+
+# Agregações por trás de cada gráfico. Esta é a implementação de referência (pandas
+# sobre o cubo); grocery.sql tem as mesmas funções em SQL e grocery.lazy em consultas
+# lazy do Polars. Cada função devolve uma tabela pequena, pronta para o gráfico.
+# python -m grocery.parity compara os outros backends com este.
+#
+# As funções com start/end aceitam um intervalo de dias (incluídos): sem intervalo usam
+# o cubo; com intervalo usam a fatia correspondente do rollup diário.
+#
+# As funções com **filtros aceitam os filtros cruzados de grocery.bitmaps (store_id,
+# product_department, household_age, household_income, household_size): sem filtros
+# usam o cubo; com filtros agregam as linhas do bitmap correspondente.
+
+# 'pandas' (referência), 'duckdb' ou 'polars'
+BACKEND = os.environ.get('GROCERY_BACKEND', 'pandas')
+
+
+def backend(nome=None):
+    nome = nome or BACKEND
+    if nome == 'duckdb':
+        from grocery import sql
+        return sql
+    if nome == 'polars':
+        from grocery import lazy
+        return lazy
+    if nome != 'pandas':
+        raise ValueError(f"Backend desconhecido: {nome}")
+    return sys.modules[__name__]
+
+
+def top_products(n=10, **filtros):
+    if filtros:
+        vendas = bitmaps.rollup('product_type', ['sales_value'], **filtros)
+    else:
+        # Ranking calculado uma vez por versão (grocery.products)
+        return products.top(n)[['product_type', 'sales_value']]
+    return vendas.nlargest(n, 'sales_value').reset_index(drop=True)
+
+
+def top_departments(n=11, **filtros):
+    if filtros:
+        vendas = bitmaps.rollup('product_department', ['sales_value'], **filtros)
+    else:
+        return products.departments(n)
+    return vendas.nlargest(n, 'sales_value').reset_index(drop=True)
+
+
+def _com_datas(diario):
+    return diario.assign(period=diario['date'].dt.strftime('%Y-%m'))
+
+
+def period_totals(start=None, end=None):
+    # KPIs da página inicial no intervalo: vendas (quantidade x preço), linhas e lojas com vendas
+    diario = store.load_daily(start, end)
+    return {
+        'sales': float(diario['total_value'].sum()),
+        'rows': int(diario['rows'].sum()),
+        'stores': sorted(diario.loc[diario['rows'] > 0, 'store_id'].unique().tolist()),
+    }
+
+
+def department_month(top=3, start=None, end=None):
+    # Vendas por mês ('period' = ano-mês, para não juntar anos diferentes) dos 'top' departamentos com mais vendas
+    if start is None and end is None:
+        vendas = cube.rollup(store.load_cube(), ['period', 'product_department'], ['quantity', 'sales_value'])
+    else:
+        vendas = cube.rollup(_com_datas(store.load_daily(start, end)), ['period', 'product_department'], ['quantity', 'sales_value'])
+    melhores = vendas.groupby('product_department', observed=True)['sales_value'].sum().nlargest(top).index
+    return vendas[vendas['product_department'].isin(melhores)].reset_index(drop=True)
+
+
+def store_period(start=None, end=None):
+    if start is None and end is None:
+        return cube.rollup(store.load_cube(), ['period', 'store_id'], ['sales_value', 'quantity'])
+    return cube.rollup(_com_datas(store.load_daily(start, end)), ['period', 'store_id'], ['sales_value', 'quantity'])
+
+
+def age_counts(**filtros):
+    if filtros:
+        return bitmaps.rollup('household_age', ['rows'], **filtros)
+    return cube.rollup(store.load_cube(), 'household_age', ['rows'])
+
+
+def income_counts(**filtros):
+    if filtros:
+        return bitmaps.rollup('household_income', ['rows'], **filtros)
+    return cube.rollup(store.load_cube(), 'household_income', ['rows'])
+
+
+def hour_counts():
+    # 24 linhas, da tabela de horas calculada na ingestão
+    return store.load_hours().groupby('hour')['rows'].sum().reset_index()
+
+
+def hour_weekday():
+    # Uma linha por dia da semana (0 = segunda) e uma coluna por hora
+    return store.load_hours().pivot_table(index='weekday', columns='hour', values='rows', aggfunc='sum')
+
+
+def hour_store():
+    # Uma linha por loja e uma coluna por hora
+    return store.load_hours().pivot_table(index='store_id', columns='hour', values='rows', aggfunc='sum')
+
+
+def store_department(loja, **filtros):
+    if filtros:
+        # A loja escolhida na página e os filtros cruzados (que também podem incluir lojas)
+        mapa = bitmaps.intersect(bitmaps.select(store_id=loja), bitmaps.select(**filtros))
+        return bitmaps.rollup('product_department', ['sales_value'], mapa)
+    return cube.rollup(store.load_cube(loja), 'product_department', ['sales_value'])
+
+
+def store_month(loja, start=None, end=None):
+    if start is None and end is None:
+        return cube.rollup(store.load_cube(loja), 'period', ['sales_value'])
+    return cube.rollup(_com_datas(store.load_daily(start, end)), 'period', ['sales_value'], store_id=loja)
+
+
+def age_department(faixas_etarias, **filtros):
+    if filtros:
+        mapa = bitmaps.intersect(bitmaps.select(household_age=list(faixas_etarias)), bitmaps.select(**filtros))
+        return bitmaps.rollup(['household_age', 'product_department'], ['rows'], mapa)
+    return cube.rollup(store.load_cube(), ['household_age', 'product_department'], ['rows'],
+                       household_age=list(faixas_etarias))
@@ -0,0 +1,130 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from grocery import store
+
+# Séries temporais ao dia ou à hora para os gráficos de detalhe. Uma série ao dia vem do
+# rollup diário (fatia contígua por data); uma série à hora é somada diretamente sobre as
+# transações partilhadas (ficheiros Arrow mapeados), parte a parte, só na janela pedida.
+#
+# Cada série é reduzida no servidor a no máximo POINTS pontos com LTTB (Largest Triangle
+# Three Buckets), que mantém picos e vales, e desenhada com traços WebGL. Aproximar a
+# janela volta a consultar os dados: até HOURLY_MAX_DAYS dias a série passa a ser à hora.
+
+POINTS = int(os.environ.get('GROCERY_SERIES_POINTS', 1000))
+HOURLY_MAX_DAYS = 31
+
+
+def resolution(start, end):
+    # 'h' para janelas curtas, 'D' para as restantes
+    inicio, fim = store.day_range(start, end)
+    return 'h' if fim - inicio <= pd.Timedelta(days=HOURLY_MAX_DAYS) else 'D'
+
+
+def lttb(x, y, pontos):
+    # Índices dos pontos escolhidos: o primeiro, o último e, em cada balde intermédio, o que
+    # forma o maior triângulo com o ponto escolhido antes e com a média do balde seguinte
+    total = len(y)
+    if pontos >= total or pontos < 3:
+        return np.arange(total)
+
+    x = np.asarray(x).astype('int64').astype('float64')
+    y = np.asarray(y, dtype='float64')
+    limites = np.linspace(1, total - 1, pontos - 1).astype('int64')
+    escolhidos = np.empty(pontos, dtype='int64')
+    escolhidos[0], escolhidos[-1] = 0, total - 1
+
+    anterior = 0
+    for i in range(pontos - 2):
+        inicio, fim = limites[i], limites[i + 1]
+        seguinte = slice(fim, limites[i + 2]) if i + 2 < len(limites) else slice(total - 1, total)
+        media_x, media_y = x[seguinte].mean(), y[seguinte].mean()
+        areas = np.abs((x[anterior] - media_x) * (y[inicio:fim] - y[anterior])
+                       - (x[anterior] - x[inicio:fim]) * (media_y - y[anterior]))
+        anterior = inicio + int(areas.argmax())
+        escolhidos[i + 1] = anterior
+    return escolhidos
+
+
+def downsample(serie, pontos=POINTS, por=None):
+    # Aplica o LTTB a cada série (uma por valor de 'por'); 'serie' tem as colunas time e sales_value
+    if por is None:
+        return serie.iloc[lttb(serie['time'], serie['sales_value'], pontos)].reset_index(drop=True)
+    grupos = [grupo.iloc[lttb(grupo['time'], grupo['sales_value'], pontos)]
+              for _, grupo in serie.groupby(por, observed=True, sort=False)]
+    return pd.concat(grupos, ignore_index=True) if grupos else serie
+
+
+def _densa(serie, inicio, fim, frequencia, por=None):
+    # Uma linha por instante da janela (zero quando não houve vendas), para o traço não saltar os buracos
+    tempos = pd.date_range(inicio, fim, freq=frequencia, inclusive='left', name='time')
+    if por is None:
+        return serie.reindex(tempos, fill_value=0).reset_index()
+    grelha = pd.MultiIndex.from_product([tempos, serie.index.levels[1]], names=['time', por])
+    return serie.reindex(grelha, fill_value=0).reset_index()
+
+
+def _por_dia(inicio, fim, loja=None, por=None):
+    diario = store.load_daily(inicio, fim - pd.Timedelta(days=1))
+    if loja is not None:
+        diario = diario[diario['store_id'] == loja]
+    chaves = ['date'] + ([por] if por else [])
+    serie = diario.groupby(chaves, observed=True)['sales_value'].sum().rename_axis(['time'] + chaves[1:])
+    if por:
+        serie.index = serie.index.set_levels(serie.index.levels[1].astype(str), level=1)
+    return serie
+
+
+def _por_hora(inicio, fim, loja=None, por=None):
+    # Soma por hora (e por valor de 'por') sobre as transações, bloco a bloco e sem cópias para pandas
+    horas = int((fim - inicio) / pd.Timedelta(hours=1))
+    origem = np.datetime64(inicio, 'h')
+    colunas = ['transaction_timestamp', 'sales_value'] + ([por] if por else [])
+    tabela = store.shared(colunas, loja)
+    valores = [] if por is None else sorted({v for bloco in tabela.column(por).chunks for v in bloco.dictionary.to_pylist()})
+    largura = max(len(valores), 1)
+    somas = np.zeros(horas * largura)
+
+    for lote in tabela.to_batches():
+        hora = (lote.column('transaction_timestamp').to_numpy().astype('datetime64[h]') - origem).astype('int64')
+        dentro = (hora >= 0) & (hora < horas)
+        celula = hora
+        if por is not None:
+            # Cada parte tem o seu dicionário: os códigos locais são traduzidos para a lista comum
+            coluna = lote.column(por)
+            codigos = pd.Index(valores).get_indexer(coluna.dictionary.to_pylist())[coluna.indices.fill_null(0).to_numpy()]
+            dentro &= coluna.is_valid().to_numpy(zero_copy_only=False)
+            celula = hora * largura + codigos
+        somas += np.bincount(celula[dentro], weights=lote.column('sales_value').to_numpy()[dentro], minlength=len(somas))
+
+    tempos = pd.date_range(inicio, periods=horas, freq='h', name='time')
+    if por is None:
+        return pd.Series(somas, index=tempos, name='sales_value')
+    indice = pd.MultiIndex.from_product([tempos, valores], names=['time', por])
+    return pd.Series(somas, index=indice, name='sales_value')
+
+
+def _serie(start, end, loja=None, por=None):
+    primeiro, ultimo = store.date_bounds()
+    inicio, fim = store.day_range(start or primeiro, end or ultimo)
+    frequencia = resolution(inicio, fim - pd.Timedelta(days=1))
+    if frequencia == 'h':
+        serie = _por_hora(inicio, fim, loja, por)
+    else:
+        serie = _por_dia(inicio, fim, loja, por)
+    return _densa(serie, inicio, fim, frequencia, por), frequencia
+
+
+def store_sales(loja, start=None, end=None, pontos=POINTS):
+    # Vendas da loja ao dia ou à hora na janela [start, end] (dias incluídos), já reduzidas
+    serie, frequencia = _serie(start, end, loja=loja)
+    return downsample(serie, pontos), frequencia
+
+
+def department_sales(departamentos, start=None, end=None, pontos=POINTS):
+    # Vendas de cada departamento pedido ao dia ou à hora, uma série reduzida por departamento
+    serie, frequencia = _serie(start, end, por='product_department')
+    serie = serie[serie['product_department'].isin([str(d) for d in departamentos])]
+    return downsample(serie, pontos, por='product_department'), frequencia
@@ -0,0 +1,170 @@
+import threading
+
+import duckdb
+
+from grocery import store
+
+# Backend SQL opcional: as mesmas agregações de grocery.queries, executadas pelo DuckDB
+# (em processo, multi-thread) diretamente sobre as partes Parquet da versão publicada.
+# Só as colunas usadas são lidas e os filtros por loja escolhem as partições logo à partida.
+# Com um intervalo de dias (start/end) as consultas correm sobre o rollup diário, que tem
+# as mesmas medidas e a coluna period. Os filtros cruzados (**filtros, os mesmos
+# de grocery.bitmaps) são condições list_contains sobre as transações.
+
+_local = threading.local()
+
+
+def _cursor():
+    # Uma ligação por thread: as sessões do Streamlit correm em threads diferentes
+    if not hasattr(_local, 'con'):
+        _local.con = duckdb.connect()
+    return _local.con
+
+
+def _transacoes(loja=None):
+    partes = store.manifest()['parts']
+    ficheiros = [str(store.STORE_DIR / parte['path']) for parte in partes if loja is None or parte['store_id'] == loja]
+    lista = ', '.join("'" + f.replace("'", "''") + "'" for f in ficheiros)
+    return f"read_parquet([{lista}], hive_partitioning = false)"
+
+
+def _diario():
+    return "read_parquet('" + str(store.STORE_DIR / store.manifest()['daily']).replace("'", "''") + "')"
+
+
+def _dias(start=None, end=None):
+    inicio, fim = store.day_range(start, end)
+    condicoes, params = [], []
+    if start is not None:
+        condicoes.append('date >= ?')
+        params.append(inicio.to_pydatetime())
+    if end is not None:
+        condicoes.append('date < ?')
+        params.append(fim.to_pydatetime())
+    onde = ' AND '.join(condicoes) or 'TRUE'
+    return (f"(SELECT *, strftime(date, '%Y-%m') AS period "
+            f"FROM {_diario()} WHERE {onde})"), params
+
+
+def _filtrar(tabela, filtros):
+    condicoes, params = [], []
+    for coluna, valor in filtros.items():
+        valores = valor if isinstance(valor, (list, tuple, set)) else [valor]
+        condicoes.append(f'list_contains(?, {coluna})')
+        params.append(list(valores))
+    return f"(SELECT * FROM {tabela} WHERE {' AND '.join(condicoes)})", params
+
+
+def _consulta(sql, params=None, loja=None, start=None, end=None, filtros=None):
+    if filtros:
+        tabela, params_filtros = _filtrar(_transacoes(loja), filtros)
+        return _cursor().execute(sql.format(t=tabela), params_filtros + (params or [])).df()
+    if start is None and end is None:
+        return _cursor().execute(sql.format(t=_transacoes(loja)), params or []).df()
+    dias, params_dias = _dias(start, end)
+    return _cursor().execute(sql.format(t=dias), params_dias + (params or [])).df()
+
+
+def period_totals(start=None, end=None):
+    dias, params = _dias(start, end)
+    linha = _cursor().execute(f"""
+        SELECT COALESCE(SUM(total_value), 0) AS sales, COALESCE(SUM(rows), 0) AS rows,
+               list(DISTINCT store_id ORDER BY store_id) FILTER (WHERE rows > 0) AS stores
+        FROM {dias}
+    """, params).fetchone()
+    return {'sales': float(linha[0]), 'rows': int(linha[1]), 'stores': list(linha[2] or [])}
+
+
+def top_products(n=10, **filtros):
+    return _consulta("""
+        SELECT product_type, SUM(sales_value) AS sales_value
+        FROM {t} GROUP BY product_type ORDER BY sales_value DESC LIMIT ?
+    """, [n], filtros=filtros)
+
+
+def top_departments(n=11, **filtros):
+    return _consulta("""
+        SELECT product_department, SUM(sales_value) AS sales_value
+        FROM {t} GROUP BY product_department ORDER BY sales_value DESC LIMIT ?
+    """, [n], filtros=filtros)
+
+
+def department_month(top=3, start=None, end=None):
+    return _consulta("""
+        WITH vendas AS (
+            SELECT period, product_department, SUM(quantity) AS quantity, SUM(sales_value) AS sales_value
+            FROM {t} GROUP BY period, product_department
+        ), melhores AS (
+            SELECT product_department FROM vendas
+            GROUP BY product_department ORDER BY SUM(sales_value) DESC LIMIT ?
+        )
+        SELECT * FROM vendas WHERE product_department IN (SELECT product_department FROM melhores)
+        ORDER BY period, product_department
+    """, [top], start=start, end=end)
+
+
+def store_period(start=None, end=None):
+    return _consulta("""
+        SELECT period, store_id, SUM(sales_value) AS sales_value, SUM(quantity) AS quantity
+        FROM {t} GROUP BY period, store_id ORDER BY period, store_id
+    """, start=start, end=end)
+
+
+def age_counts(**filtros):
+    return _consulta("""
+        SELECT household_age, COUNT(*) AS rows FROM {t} GROUP BY household_age
+    """, filtros=filtros)
+
+
+def income_counts(**filtros):
+    return _consulta("""
+        SELECT household_income, COUNT(*) AS rows FROM {t} GROUP BY household_income
+    """, filtros=filtros)
+
+
+def _horas():
+    # Tabela de horas calculada na ingestão (loja x dia da semana x hora)
+    caminho = str(store.STORE_DIR / store.manifest()['hours'])
+    return "read_parquet('" + caminho.replace("'", "''") + "')"
+
+
+def hour_counts():
+    return _cursor().execute(f"""
+        SELECT hour, SUM(rows) AS rows FROM {_horas()} GROUP BY hour ORDER BY hour
+    """).df()
+
+
+def hour_weekday():
+    contagens = _cursor().execute(f"""
+        SELECT weekday, hour, SUM(rows) AS rows FROM {_horas()} GROUP BY weekday, hour
+    """).df()
+    return contagens.pivot(index='weekday', columns='hour', values='rows').sort_index()
+
+
+def hour_store():
+    contagens = _cursor().execute(f"""
+        SELECT store_id, hour, SUM(rows) AS rows FROM {_horas()} GROUP BY store_id, hour
+    """).df()
+    return contagens.pivot(index='store_id', columns='hour', values='rows').sort_index()
+
+
+def store_department(loja, **filtros):
+    return _consulta("""
+        SELECT product_department, SUM(sales_value) AS sales_value
+        FROM {t} WHERE store_id = ? GROUP BY product_department ORDER BY product_department
+    """, [loja], loja=loja, filtros=filtros)
+
+
+def store_month(loja, start=None, end=None):
+    return _consulta("""
+        SELECT period, SUM(sales_value) AS sales_value
+        FROM {t} WHERE store_id = ? GROUP BY period ORDER BY period
+    """, [loja], loja=loja, start=start, end=end)
+
+
+def age_department(faixas_etarias, **filtros):
+    return _consulta("""
+        SELECT household_age, product_department, COUNT(*) AS rows
+        FROM {t} WHERE list_contains(?, household_age)
+        GROUP BY household_age, product_department ORDER BY household_age, product_department
+    """, [list(faixas_etarias)], filtros=filtros)
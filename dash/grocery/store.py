@@ -0,0 +1,677 @@
+import argparse
+import contextlib
+import json
+import os
+import threading
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import streamlit as st
+
+from grocery import cube, metrics
+
+# Camada de dados partilhada: o CSV é lido uma única vez e guardado em Parquet,
+# já com tipos e colunas derivadas, para que cada gráfico leia só o que precisa.
+#
+# O armazenamento é versionado: cada ingestão ou lote acrescentado gera um manifesto
+# (partes de transações, cubo, rollup diário, cestos, contagens por hora e KPIs) e o ficheiro CURRENT aponta
+# para o manifesto publicado. Trocar o CURRENT é atómico, por isso as sessões abertas
+# passam para a nova versão no rerun seguinte sem ver um estado intermédio.
+#
+# As transações são partidas por loja (parts/store_id=<loja>/) e o cubo é guardado
+# ordenado por loja, com o intervalo de linhas de cada loja no manifesto: mudar de loja
+# num gráfico só lê as linhas dessa loja.
+#
+# Cada parte é também publicada como ficheiro Arrow IPC sem compressão (.arrow), com as
+# categorias como dicionários e inteiros pequenos. Esses ficheiros são mapeados em memória
+# só para leitura: vários processos do servidor a ler a mesma versão partilham as mesmas
+# páginas (cache do sistema operativo) em vez de guardarem cada um a sua cópia.
+
+DATASET_DIR = Path(os.environ.get('GROCERY_DATA_DIR', Path(__file__).resolve().parent.parent / 'dataset'))
+CSV_PATH = DATASET_DIR / 'grocery_final.csv'
+STORE_DIR = DATASET_DIR / 'store'
+CURRENT_PATH = STORE_DIR / 'CURRENT'
+LOCK_PATH = STORE_DIR / 'LOCK'
+
+AGE_ORDER = ['Under 25', '25-34', '35-44', '45-54', '55-64', '65+']
+INCOME_ORDER = ['Under 25K', '25-49K', '50-74K', '75-99K', '100-124K', '125-149K', '150-174K', '175-199K', '200K+']
+
+# Formato dos ficheiros publicados; uma versão noutro formato tem de ser convertida com
+# python -m grocery.store migrate (a partir das suas partes, sem perder os lotes acrescentados)
+FORMAT_VERSION = 3
+
+# Colunas do CSV de origem, guardadas tal e qual em todas as partes
+COLUNAS_CSV = ['transaction_timestamp', 'store_id', 'basket_id', 'product_type', 'product_department', 'quantity',
+               'sales_value', 'household_age', 'household_income', 'household_size']
+
+CATEGORICAS = ['store_id', 'product_type', 'product_department', 'household_age', 'household_income', 'household_size', 'period']
+ORDENS = {'household_age': AGE_ORDER, 'household_income': INCOME_ORDER}
+
+# Dimensões dos filtros cruzados: os valores de cada uma ficam no manifesto, por isso as
+# opções dos filtros não obrigam a ler as transações
+CATALOGO = ['store_id', 'product_department', 'household_age', 'household_income', 'household_size']
+
+# Linhas lidas de cada vez do CSV durante a ingestão
+CHUNKSIZE = int(os.environ.get('GROCERY_CHUNKSIZE', 1_000_000))
+
+# Cada lote acrescentado cria uma parte por loja: quando uma loja passa de MAX_PARTS partes,
+# as que têm menos de CHUNKSIZE linhas são juntadas numa só
+MAX_PARTS = int(os.environ.get('GROCERY_MAX_PARTS', 8))
+
+# Versões mantidas em disco (a publicada e as anteriores, para as sessões a meio de um rerun)
+KEEP_VERSIONS = int(os.environ.get('GROCERY_KEEP_VERSIONS', 2))
+
+# Um único escritor de cada vez: o lock das threads deste processo e um lock no ficheiro
+# LOCK para os outros processos (CLI, outros servidores sobre a mesma pasta)
+_lock = threading.RLock()
+
+
+@contextlib.contextmanager
+def _escritor():
+    with _lock:
+        STORE_DIR.mkdir(parents=True, exist_ok=True)
+        with open(LOCK_PATH, 'a+b') as ficheiro:
+            if fcntl is not None:
+                fcntl.flock(ficheiro, fcntl.LOCK_EX)
+            else:
+                ficheiro.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(ficheiro.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(ficheiro, fcntl.LOCK_UN)
+                else:
+                    ficheiro.seek(0)
+                    msvcrt.locking(ficheiro.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _categoria(serie, ordem=None):
+    # Mantém a ordem conhecida e acrescenta no fim valores inesperados, em vez de os perder
+    valores = serie.dropna().unique().tolist()
+    if ordem is None:
+        return serie.astype(pd.CategoricalDtype(sorted(valores)))
+    extras = sorted(v for v in valores if v not in ordem)
+    return serie.astype(pd.CategoricalDtype(ordem + extras, ordered=True))
+
+
+def preparar(df):
+    df['transaction_timestamp'] = pd.to_datetime(df['transaction_timestamp'])
+
+    df['quantity'] = pd.to_numeric(df['quantity'], downcast='integer')
+    df['sales_value'] = df['sales_value'].astype('float64')
+
+    # Colunas derivadas, calculadas uma vez em vez de em cada gráfico
+    df['hour'] = df['transaction_timestamp'].dt.hour.astype('int8')
+    df['weekday'] = df['transaction_timestamp'].dt.dayofweek.astype('int8')
+    df['month'] = df['transaction_timestamp'].dt.month.astype('int8')
+    df['period'] = df['transaction_timestamp'].dt.to_period('M').astype(str)
+    df['household_size_num'] = df['household_size'].astype(str).str.replace('+', '').astype('int8')
+
+    for coluna in CATEGORICAS:
+        df[coluna] = _categoria(df[coluna], ORDENS.get(coluna))
+    df['age_order'] = df['household_age'].cat.codes.astype('int8')
+
+    return df
+
+
+# Tabela de factos dos cestos: uma linha por cesto, com o valor total, o número de linhas
+# e de unidades, a loja, o momento da compra e os atributos do agregado familiar
+COLUNAS_CESTOS = ['basket_id', 'total_value', 'items', 'quantity', 'store_id', 'transaction_timestamp',
+                  'household_age', 'household_income', 'household_size']
+ATRIBUTOS_CESTOS = ['store_id', 'household_age', 'household_income', 'household_size']
+
+
+def _cestos(df):
+    total_value = df['sales_value'] * df['quantity']
+    cestos = df.assign(total_value=total_value).groupby('basket_id', sort=False, observed=True).agg(
+        total_value=('total_value', 'sum'),
+        items=('total_value', 'size'),
+        quantity=('quantity', 'sum'),
+        transaction_timestamp=('transaction_timestamp', 'min'),
+        **{coluna: (coluna, 'first') for coluna in ATRIBUTOS_CESTOS},
+    ).reset_index()
+    return _compactar_cestos(cestos)
+
+
+def _compactar_cestos(cestos):
+    # Tipos compactos: inteiros pequenos e categorias para os atributos
+    cestos['items'] = cestos['items'].astype('int32')
+    cestos['quantity'] = cestos['quantity'].astype('int32')
+    for coluna in ATRIBUTOS_CESTOS:
+        cestos[coluna] = _categoria(cestos[coluna].astype(object), ORDENS.get(coluna))
+    return cestos[COLUNAS_CESTOS]
+
+
+def _juntar_cestos(cestos):
+    cestos = pd.concat(cestos, ignore_index=True)
+    if cestos['basket_id'].duplicated().any():
+        # Cesto dividido entre blocos/lotes: soma os valores e fica com o primeiro momento
+        cestos = cestos.groupby('basket_id', observed=True).agg(
+            total_value=('total_value', 'sum'),
+            items=('items', 'sum'),
+            quantity=('quantity', 'sum'),
+            transaction_timestamp=('transaction_timestamp', 'min'),
+            **{coluna: (coluna, 'first') for coluna in ATRIBUTOS_CESTOS},
+        ).reset_index()
+    # Ordenada pelo momento da compra: um intervalo de datas é uma fatia contígua
+    cestos = cestos.sort_values('transaction_timestamp', kind='stable', ignore_index=True)
+    return _compactar_cestos(cestos)
+
+
+def _horas(df):
+    # Transações por loja, dia da semana (0 = segunda) e hora: no máximo lojas x 7 x 24 linhas
+    horas = df.groupby(['store_id', 'weekday', 'hour'], observed=True).size().rename('rows').reset_index()
+    horas['store_id'] = horas['store_id'].astype(horas['store_id'].cat.categories.dtype)
+    return horas
+
+
+def _juntar_horas(horas, novas):
+    if horas is None:
+        return novas
+    horas = pd.concat([horas, novas], ignore_index=True)
+    return horas.groupby(['store_id', 'weekday', 'hour'])['rows'].sum().reset_index()
+
+
+def _densificar_horas(horas, lojas):
+    # Todas as combinações presentes (contagem 0 onde não houve transações): os gráficos
+    # cortam intervalos de horas sem ter de preencher buracos
+    indice = pd.MultiIndex.from_product([lojas, range(7), range(24)], names=['store_id', 'weekday', 'hour'])
+    horas = horas.set_index(['store_id', 'weekday', 'hour'])['rows'].reindex(indice, fill_value=0)
+    return horas.astype('int64').reset_index()
+
+
+def _totais(df, totais=None):
+    totais = dict(totais or {'sales': 0.0, 'rows': 0, 'stores': [], 'baskets': 0})
+    totais['sales'] += float((df['quantity'] * df['sales_value']).sum())
+    totais['rows'] += len(df)
+    totais['stores'] = sorted(set(totais['stores']) | set(df['store_id'].unique().tolist()))
+    return totais
+
+
+def _escrever(df, caminho):
+    # Escreve para um ficheiro temporário e só depois substitui, para nunca expor um Parquet incompleto
+    tmp = Path(caminho).with_suffix(f'.{os.getpid()}.parquet.tmp')
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, caminho)
+
+
+def _nativo(valor):
+    # Valores numpy não são serializáveis em JSON
+    return valor.item() if hasattr(valor, 'item') else valor
+
+
+# Tipos fixos no ficheiro Arrow, iguais em todas as partes para que possam ser juntas
+# sem conversões. As categorias ficam como dicionários com índices de 16 bits (32 bits
+# para o catálogo de produtos, que pode ser grande).
+TIPOS_ARROW = {
+    'transaction_timestamp': pa.timestamp('us'),
+    'basket_id': pa.int64(),
+    'quantity': pa.int32(),
+    'sales_value': pa.float64(),
+    'hour': pa.int8(),
+    'weekday': pa.int8(),
+    'month': pa.int8(),
+    'household_size_num': pa.int8(),
+    'age_order': pa.int8(),
+}
+INDICES_ARROW = {'product_type': pa.int32()}
+
+
+def _tipo_arrow(campo):
+    if pa.types.is_dictionary(campo.type):
+        valores = campo.type.value_type
+        if pa.types.is_large_string(valores):
+            valores = pa.string()
+        return pa.dictionary(INDICES_ARROW.get(campo.name, pa.int16()), valores, campo.type.ordered)
+    return TIPOS_ARROW.get(campo.name, campo.type)
+
+
+def _escrever_arrow(df, caminho):
+    df = df.copy(deep=False)
+    for coluna in df.columns.intersection(CATEGORICAS):
+        df[coluna] = _categoria(df[coluna], ORDENS.get(coluna))
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    esquema = pa.schema([pa.field(campo.name, _tipo_arrow(campo)) for campo in tabela.schema])
+    tabela = tabela.cast(esquema)
+
+    tmp = Path(caminho).with_suffix(f'.{os.getpid()}.arrow.tmp')
+    with pa.OSFile(str(tmp), 'wb') as ficheiro, pa.ipc.new_file(ficheiro, esquema) as escritor:
+        escritor.write_table(tabela)
+    os.replace(tmp, caminho)
+
+
+def _escrever_partes(df, versao, bloco=0, prefixo='part'):
+    partes = []
+    for loja, linhas in df.groupby('store_id', observed=True):
+        loja = _nativo(loja)
+        pasta = STORE_DIR / 'parts' / f'store_id={loja}'
+        pasta.mkdir(parents=True, exist_ok=True)
+        nome = f'parts/store_id={loja}/{prefixo}-{versao:06d}-{bloco:04d}'
+        _escrever(linhas, STORE_DIR / f'{nome}.parquet')
+        _escrever_arrow(linhas, STORE_DIR / f'{nome}.arrow')
+        partes.append({'store_id': loja, 'path': f'{nome}.parquet', 'arrow': f'{nome}.arrow'})
+    return partes
+
+
+def _compactar_partes(partes, versao):
+    # Junta as partes pequenas das lojas com mais de MAX_PARTS partes; as partes antigas
+    # continuam em disco até deixarem de ser usadas por alguma versão mantida (prune)
+    por_loja = {}
+    for parte in partes:
+        por_loja.setdefault(parte['store_id'], []).append(parte)
+
+    resultado = []
+    for bloco, (loja, partes_loja) in enumerate(por_loja.items()):
+        pequenas = [parte for parte in partes_loja
+                    if pq.ParquetFile(STORE_DIR / parte['path']).metadata.num_rows < CHUNKSIZE]
+        if len(partes_loja) <= MAX_PARTS or len(pequenas) < 2:
+            resultado += partes_loja
+            continue
+        df = pd.concat([pd.read_parquet(STORE_DIR / parte['path']) for parte in pequenas], ignore_index=True)
+        for coluna in df.columns.intersection(CATEGORICAS):
+            df[coluna] = _categoria(df[coluna].astype(object), ORDENS.get(coluna))
+        resultado += [parte for parte in partes_loja if parte not in pequenas]
+        resultado += _escrever_partes(df, versao, bloco, prefixo='merged')
+    return resultado
+
+
+def _ordenar_cubo(cubo):
+    # Linhas de cada loja contíguas: o intervalo [início, fim) fica no manifesto
+    cubo = cubo.sort_values('store_id', kind='stable', ignore_index=True)
+    posicoes = cubo.groupby('store_id', observed=True).indices
+    intervalos = {str(loja): [int(p.min()), int(p.max()) + 1] for loja, p in posicoes.items()}
+    return cubo, intervalos
+
+
+def _catalogo(cubo, cestos):
+    # Valores observados de cada dimensão do catálogo (o cubo não tem household_size)
+    catalogo = {}
+    for coluna in CATALOGO:
+        tabela = cubo if coluna in cubo else cestos
+        catalogo[coluna] = sorted(_nativo(valor) for valor in tabela[coluna].dropna().unique().tolist())
+    return catalogo
+
+
+def _publicar(versao, partes, cubo, diario, cestos, horas, totais):
+    STORE_DIR.mkdir(parents=True, exist_ok=True)
+    cubo, intervalos = _ordenar_cubo(cubo)
+    _escrever(cubo, STORE_DIR / f'cube-{versao:06d}.parquet')
+    _escrever(diario.sort_values('date', kind='stable', ignore_index=True), STORE_DIR / f'daily-{versao:06d}.parquet')
+    _escrever(cestos, STORE_DIR / f'baskets-{versao:06d}.parquet')
+    _escrever(_densificar_horas(horas, totais['stores']), STORE_DIR / f'hours-{versao:06d}.parquet')
+
+    manifesto = {
+        'format': FORMAT_VERSION,
+        'version': versao,
+        'parts': partes,
+        'stores': totais['stores'],
+        'categories': _catalogo(cubo, cestos),
+        'cube': f'cube-{versao:06d}.parquet',
+        'cube_ranges': intervalos,
+        'daily': f'daily-{versao:06d}.parquet',
+        'baskets': f'baskets-{versao:06d}.parquet',
+        'hours': f'hours-{versao:06d}.parquet',
+        'totals': totais,
+    }
+    nome = f'manifest-{versao:06d}.json'
+    (STORE_DIR / nome).write_text(json.dumps(manifesto, indent=1))
+
+    # Publicação: a partir daqui as sessões passam a ler a nova versão
+    tmp = CURRENT_PATH.with_suffix(f'.{os.getpid()}.tmp')
+    tmp.write_text(nome)
+    os.replace(tmp, CURRENT_PATH)
+
+
+def _processar(blocos, versao, anterior=None):
+    # Os blocos são lidos um a um: a memória usada depende do tamanho do bloco, do cubo
+    # e da tabela de cestos, não do número total de transações.
+    # Um cesto dividido entre blocos/lotes é juntado na tabela de cestos (_juntar_cestos),
+    # por isso os KPIs e as estatísticas do cesto ficam certos; só a medida 'baskets' do
+    # cubo o conta em cada bloco onde aparece (ver o aviso em cube.rollup).
+    partes = list(anterior['parts']) if anterior else []
+    cubo = _ler_cubo(anterior['version']) if anterior else None
+    diario = _ler_diario(anterior['version']) if anterior else None
+    cestos = [_ler_cestos(anterior['version'])] if anterior else []
+    horas = _ler_horas(anterior['version']) if anterior else None
+    totais = anterior['totals'] if anterior else None
+    linhas = 0
+
+    for i, bloco in enumerate(blocos):
+        df = preparar(bloco)
+        partes += _escrever_partes(df, versao, i)
+        cubo = cube.merge(cubo, cube.build(df))
+        diario = cube.merge_daily(diario, cube.build_daily(df))
+        cestos.append(_cestos(df))
+        horas = _juntar_horas(horas, _horas(df))
+        totais = _totais(df, totais)
+        linhas += len(df)
+
+    cestos = _juntar_cestos(cestos)
+    totais['baskets'] = len(cestos)
+    if anterior:
+        partes = _compactar_partes(partes, versao)
+
+    _publicar(versao, partes, cubo, diario, cestos, horas, totais)
+    return linhas
+
+
+def _ler_csv(caminhos):
+    for caminho in caminhos:
+        yield from pd.read_csv(caminho, chunksize=CHUNKSIZE)
+
+
+def ingest(csv_path=CSV_PATH):
+    # Ingestão completa: publica uma versão nova só com o conteúdo deste CSV.
+    # O número da versão é escolhido dentro do lock, por isso dois processos nunca publicam a mesma
+    with _escritor():
+        linhas = _processar(_ler_csv([csv_path]), current_version() + 1)
+        _apagar_antigas(KEEP_VERSIONS)
+        return linhas
+
+
+def append(csv_paths):
+    # Acrescenta lotes novos sem reler as transações já guardadas: só o lote é processado
+    # e os agregados da versão anterior são atualizados com ele.
+    with _escritor():
+        versao = current_version()
+        anterior = _migrar(_ler_manifesto(versao)) if versao else None
+        linhas = _processar(_ler_csv(csv_paths), current_version() + 1, anterior)
+        _apagar_antigas(KEEP_VERSIONS)
+        return linhas
+
+
+def _ler_partes_publicadas(manifesto):
+    # Transações de uma versão publicada, noutro formato qualquer, com as colunas do CSV e em
+    # blocos de cerca de CHUNKSIZE linhas (as partes pequenas ficam juntas)
+    bloco, linhas = [], 0
+    for parte in manifesto['parts']:
+        df = pd.read_parquet(STORE_DIR / parte['path'], columns=COLUNAS_CSV)
+        bloco.append(df.astype({coluna: object for coluna in df.columns if isinstance(df[coluna].dtype, pd.CategoricalDtype)}))
+        linhas += len(df)
+        if linhas >= CHUNKSIZE:
+            yield pd.concat(bloco, ignore_index=True)
+            bloco, linhas = [], 0
+    if bloco:
+        yield pd.concat(bloco, ignore_index=True)
+
+
+def _migrar(manifesto):
+    # Publica a versão no formato atual, refazendo as partes e os agregados (cubo, rollup
+    # diário, cestos, horas) a partir das partes dela; devolve o manifesto publicado
+    if manifesto.get('format') == FORMAT_VERSION:
+        return manifesto
+    versao = current_version() + 1
+    with metrics.timed('load:migrate'):
+        _processar(_ler_partes_publicadas(manifesto), versao)
+    return _ler_manifesto(versao)
+
+
+def migrate():
+    # Converte a versão publicada para o formato atual (não faz nada se já estiver)
+    with _escritor():
+        versao = current_version()
+        if not versao:
+            raise RuntimeError("Não há nenhuma versão publicada")
+        migrada = _migrar(_ler_manifesto(versao))
+        _apagar_antigas(KEEP_VERSIONS)
+        return migrada['version'] != versao
+
+
+def _usados(manifesto):
+    # Ficheiros (relativos a STORE_DIR) de que uma versão precisa. Os manifestos mantidos
+    # podem ser de um formato antigo (sem alguns agregados ou sem os ficheiros Arrow)
+    ficheiros = {manifesto.get(chave) for chave in ('cube', 'daily', 'baskets', 'hours')}
+    for parte in manifesto['parts']:
+        ficheiros.update((parte['path'], parte.get('arrow')))
+    ficheiros.discard(None)
+    return ficheiros
+
+
+def _apagar_antigas(manter):
+    # Apaga os manifestos anteriores às 'manter' versões mais recentes e os ficheiros que só
+    # eles usavam. Um ficheiro ainda aberto noutro processo (Windows) fica para a próxima vez.
+    atual = current_version()
+    usados, removidas = set(), []
+    for caminho in sorted(STORE_DIR.glob('manifest-*.json')):
+        versao = int(caminho.stem.split('-')[1])
+        if versao > atual - manter:
+            usados |= _usados(json.loads(caminho.read_text()))
+        else:
+            caminho.unlink(missing_ok=True)
+            removidas.append(versao)
+
+    ficheiros = list(STORE_DIR.glob('*.parquet')) + list((STORE_DIR / 'parts').rglob('*.parquet')) \
+        + list((STORE_DIR / 'parts').rglob('*.arrow'))
+    for caminho in ficheiros:
+        if caminho.relative_to(STORE_DIR).as_posix() not in usados:
+            try:
+                caminho.unlink(missing_ok=True)
+            except OSError:
+                pass
+    return removidas
+
+
+def prune(keep=KEEP_VERSIONS):
+    # Retenção: mantém só as 'keep' versões mais recentes (ingest e append já o fazem)
+    with _escritor():
+        return _apagar_antigas(max(keep, 1))
+
+
+def current_version():
+    if not CURRENT_PATH.exists():
+        return 0
+    return int(CURRENT_PATH.read_text().strip().split('-')[1].split('.')[0])
+
+
+def ensure_ingested():
+    # Primeira utilização: converte o CSV original. Uma versão num formato antigo não é
+    # convertida aqui, num pedido de uma página: a conversão é feita no CLI (migrate)
+    if not CURRENT_PATH.exists():
+        with _escritor():
+            if not CURRENT_PATH.exists():
+                with metrics.timed('load:ingest'):
+                    _processar(_ler_csv([CSV_PATH]), current_version() + 1)
+    versao = current_version()
+    if _ler_manifesto(versao).get('format') != FORMAT_VERSION:
+        raise RuntimeError(f"A versão {versao} dos dados está num formato antigo; "
+                           f"converta-a com: python -m grocery.store migrate")
+    return versao
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _ler_manifesto(versao):
+    return json.loads((STORE_DIR / f'manifest-{versao:06d}.json').read_text())
+
+
+def manifest(versao=None):
+    return _ler_manifesto(versao or ensure_ingested())
+
+
+def totals():
+    return manifest()['totals']
+
+
+def stores():
+    # Catálogo de lojas guardado no manifesto: não depende do tamanho dos dados
+    return manifest()['stores']
+
+
+def category_dtype(coluna, valores):
+    # Tipo categórico dos valores, com a ordem conhecida da coluna (faixas etárias e de rendimento)
+    return _categoria(pd.Series(list(valores), dtype=object), ORDENS.get(coluna)).dtype
+
+
+def categories(coluna, version=None):
+    # Valores de uma dimensão do catálogo, pela ordem das categorias
+    return category_dtype(coluna, manifest(version)['categories'][coluna]).categories.tolist()
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _mapear(versao):
+    # Uma tabela por parte, lida diretamente do ficheiro mapeado em memória (sem cópias)
+    tabelas = []
+    with metrics.timed('load:map'):
+        for parte in _ler_manifesto(versao)['parts']:
+            caminho = STORE_DIR / parte['arrow']
+            tabelas.append((parte['store_id'], pa.ipc.open_file(pa.memory_map(str(caminho))).read_all()))
+    return tabelas
+
+
+def shared(columns=None, store_id=None, version=None):
+    # Transações como tabela Arrow apoiada nos ficheiros mapeados: não ocupa memória privada
+    # do processo. Converter para pandas (to_pandas) cria uma cópia.
+    tabelas = [tabela for loja, tabela in _mapear(version or ensure_ingested()) if store_id is None or loja == store_id]
+    if columns:
+        tabelas = [tabela.select(list(columns)) for tabela in tabelas]
+    if not tabelas:
+        return pa.table({})
+    # Partes de versões antigas podem não ter as colunas mais recentes (ficam a nulo)
+    return pa.concat_tables(tabelas, promote_options='default')
+
+
+def _ler_partes(versao, colunas, loja=None):
+    with metrics.timed('load:transactions'):
+        df = shared(colunas, loja, versao).to_pandas(split_blocks=True)
+
+    # As partes podem ter dicionários diferentes: volta a aplicar as categorias ordenadas
+    for coluna in df.columns.intersection(CATEGORICAS):
+        df[coluna] = _categoria(df[coluna], ORDENS.get(coluna))
+    return df
+
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def _ler(colunas, versao):
+    return _ler_partes(versao, colunas)
+
+
+def load(columns=None):
+    # O resultado é partilhado entre sessões: quem o usar não o deve alterar
+    return _ler(tuple(columns) if columns else None, ensure_ingested())
+
+
+def read_store(store_id, columns=None, version=None):
+    # Só lê a partição da loja pedida, sem guardar o resultado em cache (para cálculos feitos uma vez por versão)
+    return _ler_partes(version or ensure_ingested(), columns, store_id)
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _ler_cubo(versao):
+    with metrics.timed('load:cube'):
+        cubo = pd.read_parquet(STORE_DIR / _ler_manifesto(versao)['cube'])
+    for coluna in cubo.columns.intersection(CATEGORICAS):
+        cubo[coluna] = _categoria(cubo[coluna], ORDENS.get(coluna))
+    return cubo
+
+
+def load_cube(store_id=None, version=None):
+    versao = version or ensure_ingested()
+    cubo = _ler_cubo(versao)
+    if store_id is None:
+        return cubo
+
+    # Fatia contígua do cubo, sem percorrer as outras lojas
+    inicio, fim = _ler_manifesto(versao)['cube_ranges'].get(str(store_id), [0, 0])
+    return cubo.iloc[inicio:fim]
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _ler_diario(versao):
+    with metrics.timed('load:daily'):
+        diario = pd.read_parquet(STORE_DIR / _ler_manifesto(versao)['daily'])
+    for coluna in diario.columns.intersection(CATEGORICAS):
+        diario[coluna] = _categoria(diario[coluna], ORDENS.get(coluna))
+    return diario
+
+
+def day_range(start=None, end=None):
+    # Intervalo de dias [start, end], ambos incluídos, como instantes [início, fim); None = sem limite
+    inicio = pd.Timestamp(start).normalize() if start is not None else None
+    fim = pd.Timestamp(end).normalize() + pd.Timedelta(days=1) if end is not None else None
+    return inicio, fim
+
+
+def search_range(datas, start=None, end=None):
+    # Posições [i, j) do intervalo de dias num array de datas ordenado (pesquisa binária)
+    inicio, fim = day_range(start, end)
+    datas = np.asarray(datas)
+    i = np.searchsorted(datas, np.datetime64(inicio, 'ns').astype(datas.dtype), side='left') if inicio is not None else 0
+    j = np.searchsorted(datas, np.datetime64(fim, 'ns').astype(datas.dtype), side='left') if fim is not None else len(datas)
+    return int(i), int(j)
+
+
+def load_daily(start=None, end=None, version=None):
+    # Rollup diário ordenado por data: o intervalo é encontrado por pesquisa binária
+    diario = _ler_diario(version or ensure_ingested())
+    if start is None and end is None:
+        return diario
+    i, j = search_range(diario['date'].to_numpy(), start, end)
+    return diario.iloc[i:j]
+
+
+def date_bounds():
+    # Primeiro e último dia com transações
+    datas = _ler_diario(ensure_ingested())['date']
+    return datas.iloc[0].date(), datas.iloc[-1].date()
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _ler_cestos(versao):
+    with metrics.timed('load:baskets'):
+        cestos = pd.read_parquet(STORE_DIR / _ler_manifesto(versao)['baskets'])
+    for coluna in ATRIBUTOS_CESTOS:
+        cestos[coluna] = _categoria(cestos[coluna], ORDENS.get(coluna))
+    return cestos
+
+
+def load_baskets(version=None):
+    # O resultado é partilhado entre sessões: quem o usar não o deve alterar
+    return _ler_cestos(version or ensure_ingested())
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _ler_horas(versao):
+    with metrics.timed('load:hours'):
+        return pd.read_parquet(STORE_DIR / _ler_manifesto(versao)['hours'])
+
+
+def load_hours():
+    # Contagens já agrupadas por loja, dia da semana e hora (tabela densa, uma linha por combinação)
+    return _ler_horas(ensure_ingested())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Ingestão dos dados do dashboard')
+    sub = parser.add_subparsers(dest='comando', required=True)
+    p_ingest = sub.add_parser('ingest', help='Ingestão completa a partir de um CSV')
+    p_ingest.add_argument('csv', nargs='?', default=CSV_PATH, type=Path)
+    p_append = sub.add_parser('append', help='Acrescenta lotes de transações à versão atual')
+    p_append.add_argument('csv', nargs='+', type=Path)
+    sub.add_parser('migrate', help='Converte a versão publicada para o formato atual, a partir das suas partes')
+    p_prune = sub.add_parser('prune', help='Apaga as versões antigas e os ficheiros que já não são usados')
+    p_prune.add_argument('--keep', type=int, default=KEEP_VERSIONS, help='Versões mantidas, incluindo a publicada')
+    args = parser.parse_args()
+
+    if args.comando == 'prune':
+        removidas = prune(args.keep)
+        print(f"Versões removidas: {', '.join(f'{v:06d}' for v in removidas) or 'nenhuma'}")
+    elif args.comando == 'migrate':
+        convertida = migrate()
+        print(f"{'Versão convertida' if convertida else 'Já estava no formato atual'}; versão publicada: {current_version()}")
+    else:
+        linhas = ingest(args.csv) if args.comando == 'ingest' else append(args.csv)
+        print(f"{linhas} linhas processadas; versão publicada: {current_version()}")
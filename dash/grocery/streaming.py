@@ -0,0 +1,159 @@
+import argparse
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import streamlit as st
+
+from grocery import store
+
+# Cálculo em streaming dos KPIs da página inicial e das estatísticas do cesto: as
+# partes Parquet da versão publicada (incluindo os lotes acrescentados) ou um CSV são
+# lidos em blocos e nunca estão todos em memória.
+#
+# Modo exato: os totais parciais de cada cesto são espalhados por ficheiros temporários
+# (por hash do basket_id) e cada ficheiro é agregado no fim, um de cada vez.
+# Modo aproximado: uma única passagem, com HyperLogLog para contar os cestos distintos.
+
+CHUNKSIZE = int(os.environ.get('GROCERY_CHUNKSIZE', 1_000_000))
+BUCKETS = 64
+
+# '' (desligado), 'exact' ou 'approx'; usado pela página inicial
+MODE = os.environ.get('GROCERY_STREAMING', '')
+
+COLUNAS = ['store_id', 'basket_id', 'quantity', 'sales_value']
+
+
+class HyperLogLog:
+    def __init__(self, p=14):
+        self.p = p
+        self.m = 1 << p
+        self.registos = np.zeros(self.m, dtype=np.uint8)
+
+    def add(self, valores):
+        h = pd.util.hash_pandas_object(pd.Series(valores), index=False).to_numpy()
+        indice = (h >> np.uint64(64 - self.p)).astype(np.int64)
+        resto = h & np.uint64((1 << (64 - self.p)) - 1)
+
+        # Posição do primeiro bit a 1 nos bits restantes (frexp é exato abaixo de 2**53)
+        _, expoente = np.frexp(resto.astype(np.float64))
+        rho = (64 - self.p) - expoente + 1
+        np.maximum.at(self.registos, indice, rho.astype(np.uint8))
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimativa = alpha * self.m ** 2 / np.sum(2.0 ** -self.registos.astype(np.float64))
+
+        # Correção para cardinalidades pequenas (contagem linear)
+        vazios = np.count_nonzero(self.registos == 0)
+        if estimativa <= 2.5 * self.m and vazios:
+            estimativa = self.m * np.log(self.m / vazios)
+        return int(round(estimativa))
+
+
+def _blocos(csv_path, chunksize):
+    return pd.read_csv(csv_path, usecols=COLUNAS, chunksize=chunksize)
+
+
+def _blocos_publicados(versao, chunksize):
+    # Todas as partes do manifesto, lote a lote, só com as colunas usadas
+    for parte in store.manifest(versao)['parts']:
+        ficheiro = pq.ParquetFile(store.STORE_DIR / parte['path'])
+        for lote in ficheiro.iter_batches(batch_size=chunksize, columns=COLUNAS):
+            yield lote.to_pandas()
+
+
+def _estatisticas_cestos(pasta):
+    # Cada ficheiro tem os totais parciais de um subconjunto disjunto de cestos
+    n, soma, minimo, maximo = 0, 0.0, np.inf, -np.inf
+    for ficheiro in sorted(Path(pasta).glob('bucket-*.npy')):
+        tamanho = ficheiro.stat().st_size
+        if not tamanho:
+            continue
+
+        chaves, valores = [], []
+        with open(ficheiro, 'rb') as f:
+            while f.tell() < tamanho:
+                chaves.append(np.load(f))
+                valores.append(np.load(f))
+        totais = pd.Series(np.concatenate(valores)).groupby(np.concatenate(chaves)).sum()
+        n += len(totais)
+        soma += float(totais.sum())
+        minimo = min(minimo, float(totais.min()))
+        maximo = max(maximo, float(totais.max()))
+    return n, soma, minimo, maximo
+
+
+def kpis(csv_path=None, chunksize=CHUNKSIZE, approximate=False, version=None):
+    # Sem csv_path lê a versão publicada (ou a versão indicada)
+    blocos = _blocos(csv_path, chunksize) if csv_path is not None else _blocos_publicados(version, chunksize)
+    total_sales = 0.0
+    lojas = set()
+    hll = HyperLogLog() if approximate else None
+
+    with tempfile.TemporaryDirectory() as pasta:
+        ficheiros = [] if approximate else [open(Path(pasta) / f'bucket-{i:03d}.npy', 'wb') for i in range(BUCKETS)]
+        try:
+            for bloco in blocos:
+                total_value = bloco['quantity'] * bloco['sales_value']
+                total_sales += float(total_value.sum())
+                lojas.update(bloco['store_id'].unique().tolist())
+
+                if approximate:
+                    hll.add(bloco['basket_id'])
+                    continue
+
+                # Totais parciais por cesto, identificados pelo hash de 64 bits do basket_id
+                parciais = total_value.groupby(bloco['basket_id']).sum()
+                chaves = pd.util.hash_pandas_object(parciais.index.to_series(), index=False).to_numpy()
+                balde = chaves % np.uint64(BUCKETS)
+                for i in np.unique(balde):
+                    selecao = balde == i
+                    np.save(ficheiros[i], chaves[selecao])
+                    np.save(ficheiros[i], parciais.to_numpy()[selecao])
+        finally:
+            for f in ficheiros:
+                f.close()
+
+        if approximate:
+            total_orders = hll.count()
+            media = total_sales / total_orders if total_orders else float('nan')
+            minimo = maximo = None
+        else:
+            total_orders, soma, minimo, maximo = _estatisticas_cestos(pasta)
+            media = soma / total_orders if total_orders else float('nan')
+
+    return {
+        'total_sales': total_sales,
+        'total_stores': len(lojas),
+        'total_orders': total_orders,
+        'basket_mean': round(media, 2),
+        'basket_min': minimo,
+        'basket_max': maximo,
+    }
+
+
+@st.cache_data(show_spinner=False)
+def _kpis_cache(versao, approximate):
+    return kpis(approximate=approximate, version=versao)
+
+
+def cached_kpis(approximate=None):
+    # Recalcula apenas quando é publicada uma versão nova
+    if approximate is None:
+        approximate = MODE == 'approx'
+    return _kpis_cache(store.ensure_ingested(), approximate)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='KPIs da página inicial calculados em streaming')
+    parser.add_argument('csv', nargs='?', type=Path, help='CSV a ler em vez da versão publicada')
+    parser.add_argument('--chunksize', type=int, default=CHUNKSIZE)
+    parser.add_argument('--approx', action='store_true', help='Conta os cestos com HyperLogLog (uma passagem, sem ficheiros temporários)')
+    args = parser.parse_args()
+
+    for nome, valor in kpis(args.csv, args.chunksize, args.approx).items():
+        print(f"{nome}: {valor}")
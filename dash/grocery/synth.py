@@ -0,0 +1,124 @@
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from grocery import store
+
+# Gerador determinístico de transações com o mesmo esquema do grocery_final.csv,
+# usado pelos benchmarks e pelos testes de carga. A mesma semente e os mesmos
+# parâmetros produzem sempre o mesmo ficheiro.
+
+DEPARTAMENTOS = {
+    'GROCERY': ['SOFT DRINKS', 'FLUID MILK PRODUCTS', 'BAKED BREAD/BUNS/ROLLS', 'CHEESE', 'BEERS/ALES', 'BAG SNACKS',
+                'COLD CEREAL', 'FROZEN PIZZA', 'CANNED JUICES', 'EGGS'],
+    'MEAT': ['BEEF', 'CHICKEN', 'PORK', 'LUNCHMEAT', 'SMOKED MEATS'],
+    'PRODUCE': ['TROPICAL FRUIT', 'VEGETABLES - ALL OTHERS', 'BERRIES', 'POTATOES', 'SALAD MIX'],
+    'PASTRY': ['BREAKFAST SWEETS', 'CAKES', 'COOKIES'],
+    'DELI': ['DELI MEATS', 'SANDWICHES', 'CHEESES'],
+    'SEAFOOD': ['SEAFOOD - FROZEN', 'SEAFOOD - SHELF STABLE'],
+    'COSMETICS': ['MAKEUP AND TREATMENT', 'HAIR CARE'],
+    'NUTRITION': ['VITAMINS', 'NUTRITIONAL SUPPLEMENTS'],
+    'SPIRITS': ['LIQUOR'],
+}
+# Peso de cada departamento nas vendas (GROCERY domina, como nos dados reais)
+PESOS = {'GROCERY': 0.5, 'MEAT': 0.12, 'PRODUCE': 0.14, 'PASTRY': 0.06, 'DELI': 0.06, 'SEAFOOD': 0.03,
+         'COSMETICS': 0.03, 'NUTRITION': 0.04, 'SPIRITS': 0.02}
+SIZES = ['1', '2', '3', '4', '5+']
+
+
+def _catalogo(n_products):
+    # n_products > tipos base: acrescenta variantes numeradas para simular um catálogo grande
+    base = [(departamento, tipo) for departamento, tipos in DEPARTAMENTOS.items() for tipo in tipos]
+    tipos = [tipo for _, tipo in base]
+    departamentos = [departamento for departamento, _ in base]
+    for i in range(max(0, n_products - len(base))):
+        departamento, tipo = base[i % len(base)]
+        tipos.append(f'{tipo} #{i // len(base) + 1}')
+        departamentos.append(departamento)
+
+    pesos = np.array([PESOS[d] for d in departamentos])
+    # Distribuição de cauda longa dentro do catálogo
+    pesos = pesos / np.arange(1, len(tipos) + 1) ** 0.8
+    return np.array(tipos, dtype=object), np.array(departamentos, dtype=object), pesos / pesos.sum()
+
+
+def generate(rows, seed=42, stores=6, households=2500, n_products=None, start='2023-01-01', years=1,
+             chunksize=1_000_000):
+    # Gera as transações em blocos (um DataFrame por bloco), cada cesto inteiro num só bloco
+    rng = np.random.default_rng(seed)
+    tipos, departamentos, pesos = _catalogo(n_products or 0)
+
+    lojas = np.array([311, 367, 381, 412, 433, 445, 457, 480, 514, 536][:stores] if stores <= 10
+                     else np.arange(300, 300 + stores))
+    idade = rng.choice(store.AGE_ORDER, size=households, p=[0.05, 0.2, 0.25, 0.25, 0.15, 0.1])
+    rendimento = rng.choice(store.INCOME_ORDER, size=households, p=[0.08, 0.2, 0.25, 0.17, 0.12, 0.07, 0.05, 0.03, 0.03])
+    tamanho = rng.choice(SIZES, size=households, p=[0.3, 0.35, 0.15, 0.1, 0.1])
+    loja_habitual = rng.integers(0, len(lojas), size=households)
+
+    inicio = pd.Timestamp(start).value // 10 ** 9
+    segundos = int(365 * years * 24 * 3600)
+    cesto_id = 26_000_000_000
+
+    gerados = 0
+    while gerados < rows:
+        n = min(chunksize, rows - gerados)
+
+        # Cestos com 1 a ~20 artigos; o último cesto é cortado para acertar no número de linhas
+        itens = rng.geometric(0.12, size=n // 4 + 1)
+        itens = itens[np.cumsum(itens) <= n]
+        if itens.sum() < n:
+            itens = np.append(itens, n - itens.sum())
+        n_cestos = len(itens)
+
+        casa = rng.integers(0, households, size=n_cestos)
+        dia = rng.integers(0, segundos // 86400, size=n_cestos)
+        hora = np.clip(np.round(rng.normal(15, 3.5, size=n_cestos)), 8, 22).astype(np.int64)
+        minuto = rng.integers(0, 60, size=n_cestos)
+        momento = inicio + dia * 86400 + hora * 3600 + minuto * 60
+
+        repetir = np.repeat(np.arange(n_cestos), itens)
+        produto = rng.choice(len(tipos), size=n, p=pesos)
+
+        df = pd.DataFrame({
+            'transaction_timestamp': pd.to_datetime(momento[repetir], unit='s'),
+            'store_id': lojas[loja_habitual[casa]][repetir],
+            'basket_id': cesto_id + np.arange(n_cestos)[repetir],
+            'product_type': tipos[produto],
+            'product_department': departamentos[produto],
+            'quantity': rng.integers(1, 4, size=n),
+            'sales_value': np.round(rng.gamma(2.0, 1.6, size=n), 2),
+            'household_age': idade[casa][repetir],
+            'household_income': rendimento[casa][repetir],
+            'household_size': tamanho[casa][repetir],
+        })
+        yield df
+
+        cesto_id += n_cestos
+        gerados += n
+
+
+def write_csv(path, rows, **kwargs):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.csv.tmp')
+    for i, bloco in enumerate(generate(rows, **kwargs)):
+        bloco.to_csv(tmp, mode='w' if i == 0 else 'a', header=i == 0, index=False,
+                     date_format='%Y-%m-%d %H:%M:%S')
+    tmp.replace(path)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Gera um CSV sintético com o esquema do grocery_final.csv')
+    parser.add_argument('rows', type=int)
+    parser.add_argument('--out', type=Path, default=store.CSV_PATH)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--stores', type=int, default=6)
+    parser.add_argument('--products', type=int, default=None)
+    parser.add_argument('--years', type=int, default=1)
+    args = parser.parse_args()
+
+    write_csv(args.out, args.rows, seed=args.seed, stores=args.stores, n_products=args.products, years=args.years)
+    print(f"{args.rows} linhas escritas em {args.out}")
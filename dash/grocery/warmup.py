@@ -0,0 +1,66 @@
+import argparse
+import os
+import threading
+import time
+
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from grocery import baskets, bitmaps, boxstats, metrics, products, store
+
+# Pré-carregamento dos dados partilhados. Com GROCERY_WARMUP=1, o primeiro rerun do
+# processo lança uma thread que lê o manifesto, o cubo, a tabela de horas, os cestos,
+# os resumos dos boxplots, o índice de bitmaps dos filtros cruzados e o ranking de produtos, para que as páginas
+# abertas a seguir já os encontrem em cache. Sem a opção, cada um destes dados só é lido quando alguma página o pede.
+
+ENABLED = os.environ.get('GROCERY_WARMUP', '') not in ('', '0')
+
+_lock = threading.Lock()
+_iniciado = False
+
+
+def _passos():
+    yield 'ingest', store.ensure_ingested
+    yield 'cube', store.load_cube
+    yield 'hours', store.load_hours
+    yield 'baskets', baskets.stats
+    yield 'boxstats', boxstats.por_loja
+    yield 'bitmaps', bitmaps.build
+    yield 'products', products.size
+
+
+def run():
+    tempos = {}
+    for nome, passo in _passos():
+        inicio = time.perf_counter()
+        passo()
+        tempos[nome] = time.perf_counter() - inicio
+        metrics.record(f'warmup:{nome}', tempos[nome])
+    return tempos
+
+
+def start(force=False):
+    # Uma única thread por processo, mesmo com várias sessões a abrir ao mesmo tempo
+    global _iniciado
+    if not (ENABLED or force):
+        return None
+    with _lock:
+        if _iniciado:
+            return None
+        _iniciado = True
+
+    thread = threading.Thread(target=run, name='grocery-warmup', daemon=True)
+    # Contexto da sessão que a lançou, para que as caches do Streamlit (st.cache_resource) funcionem
+    # nesta thread como nas do pool (grocery.pool); a thread termina no fim do pré-carregamento
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is not None:
+        add_script_run_ctx(thread, ctx)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Lê os dados partilhados do dashboard e mostra o tempo de cada passo')
+    parser.parse_args()
+
+    for nome, segundos in run().items():
+        print(f"{nome}: {segundos:.3f}s")
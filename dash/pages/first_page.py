@@ -1,17 +1,9 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 
-st.set_page_config(page_title="Clientes",page_icon=':green_apple:',layout="wide",initial_sidebar_state='expanded')
+from grocery import figcache, filters, metrics, pool, queries
 
-df = pd.read_csv('grocery_final.csv')
-caminho_arquivo = 'grocery_final.csv'
-dados = pd.read_csv(caminho_arquivo)
-
-regression = dados.copy()
-regression['household_size'] = regression['household_size'].str.replace('+', '').astype(int)
-regression['household_size'].unique()
-regression['household_income'].unique()
+q = queries.backend()
 
 def preparar_dados(dados):
     rotulos = {
@@ -22,20 +14,12 @@ def preparar_dados(dados):
         '35-44': 'Entre 35 e 44',
         '55-64': 'Entre 55 e 64'
     }
-    dados['household_age'] = dados['household_age'].map(rotulos)
-
     # Ordem para classificação
     ordem_personalizada = ['Menos de 25', 'Entre 25 e 34', 'Entre 35 e 44', 'Entre 45 e 54', 'Entre 55 e 64', 'Mais de 65']
-    mapeamento = {idade: i for i, idade in enumerate(ordem_personalizada)}
-    dados['ordem'] = dados['household_age'].map(mapeamento)
-
-    # Ordenar dados pela ordem_personalizada
-    dados_ordenados = dados.sort_values(by='ordem')
-    dados_ordenados.drop(columns=['ordem'], inplace=True)
-    dados_ordenados.reset_index(drop=True, inplace=True)
 
-    # Obter contagem de cada grupo etário
-    contagem = dados_ordenados['household_age'].value_counts()
+    # Obter contagem de cada grupo etário (os rótulos são aplicados às contagens, não a cada linha)
+    contagem = dados.set_index('household_age')['rows']
+    contagem.index = contagem.index.astype(str).map(rotulos)
     contagem_ordem_personalizada = contagem.reindex(ordem_personalizada)
 
     # Preparar dados para o gráfico de barras
@@ -75,7 +59,7 @@ def grafico_12(contagem_df):
 #######################################Ocorrências Por Intervalos De Rendimentos (gráfico de barras)#########################################################
 def grafico_13(regression):
     specific_order = ['Under 25K', '25-49K', '50-74K', '75-99K', '100-124K', '125-149K', '150-174K', '175-199K', '200K+']
-    regression_sorted = regression['household_income'].value_counts().reindex(specific_order)
+    regression_sorted = regression.set_index('household_income')['rows'].reindex(specific_order)
 
     color_palette = ['#377683', '#065465', '#065465', '#065465', '#065465', '#065465', '#065465', '#065465', '#065465']
     figura_3 = px.bar(
@@ -111,30 +95,62 @@ def grafico_13(regression):
 
     return figura_3
 
-#######################################Transações por Hora do dia (histograma)#########################################################
-def grafico_7(df):
-    df['transaction_timestamp'] = pd.to_datetime(df['transaction_timestamp'])
-    df['hour'] = df['transaction_timestamp'].dt.hour
-
-    st.sidebar.title('Filtro Histograma')
-    start_hour = st.sidebar.slider('Hora de Início', min_value=8, max_value=22, value=8)
-    end_hour = st.sidebar.slider('Hora de Fim', min_value=8, max_value=22, value=22)
-
-    filtered_df = df[(df['hour'] >= start_hour) & (df['hour'] <= end_hour)]
-
-    figura_4 = px.histogram(filtered_df, x='hour', title='Transações por Hora do Dia',
-                            labels={'hour': 'Hora do Dia', 'count': 'Ocorrências'},
-                            nbins=min(end_hour - start_hour + 1, 24), color_discrete_sequence=['#9AD0C2'])
+#######################################Transações por Hora do dia (gráfico de barras)#########################################################
+DIAS_DA_SEMANA = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
+
+def grafico_7(contagens, start_hour, end_hour, por=None):
+    # As contagens já vêm agrupadas por hora (24 valores): o gráfico só recebe as barras
+    # do intervalo escolhido, seja qual for o número de transações
+    if por is None:
+        filtered_df = contagens[(contagens['hour'] >= start_hour) & (contagens['hour'] <= end_hour)]
+        figura_4 = px.bar(filtered_df, x='hour', y='rows', title='Transações por Hora do Dia',
+                          labels={'hour': 'Hora do Dia', 'rows': 'Ocorrências'},
+                          color_discrete_sequence=['#9AD0C2'])
+    else:
+        # Tabela dia da semana x hora ou loja x hora: barras empilhadas
+        filtered_df = contagens.loc[:, start_hour:end_hour]
+        if por == 'weekday':
+            filtered_df = filtered_df.rename(index=dict(enumerate(DIAS_DA_SEMANA)))
+        filtered_df = filtered_df.rename_axis(index='grupo', columns='hour').stack().rename('rows').reset_index()
+        filtered_df['grupo'] = filtered_df['grupo'].astype(str)
+        figura_4 = px.bar(filtered_df, x='hour', y='rows', color='grupo', title='Transações por Hora do Dia',
+                          labels={'hour': 'Hora do Dia', 'rows': 'Ocorrências',
+                                  'grupo': 'Dia da Semana' if por == 'weekday' else 'Loja'},
+                          color_discrete_sequence=px.colors.sequential.Darkmint_r)
 
     figura_4.update_layout(plot_bgcolor='rgba(0,0,0,0)',
                            paper_bgcolor='rgba(0,0,0,0)',
                            width=1250,
                            height=500,
-                           title_x=0.38)
+                           title_x=0.38,
+                           bargap=0.05)
+    figura_4.update_xaxes(dtick=1)
+    figura_4.update_yaxes(title_text='Ocorrências')
 
     return figura_4
+
+# O filtro de horas e o histograma formam um fragmento: mexer nos sliders só volta a
+# correr esta função, sem recalcular os outros gráficos da página
+@st.fragment
+def filtro_histograma():
+    with metrics.fragment('first_page.grafico_7'):
+        st.subheader('Filtro Histograma')
+        col1, col2 = st.columns(2)
+        with col1:
+            start_hour = st.slider('Hora de Início', min_value=8, max_value=22, value=8)
+        with col2:
+            end_hour = st.slider('Hora de Fim', min_value=8, max_value=22, value=22)
+        desagregar = st.radio('Desagregar por', ['Total', 'Dia da Semana', 'Loja'], horizontal=True)
+
+        por = {'Total': None, 'Dia da Semana': 'weekday', 'Loja': 'store_id'}[desagregar]
+        contagens = {None: q.hour_counts, 'weekday': q.hour_weekday, 'store_id': q.hour_store}[por]
+        figura_4 = figcache.figura('first_page.grafico_7', lambda: grafico_7(contagens(), start_hour, end_hour, por),
+                                   start_hour=start_hour, end_hour=end_hour, por=por)
+        metrics.plotly_chart('grafico_7', figura_4)
+
 def app():
-    contagem_df = preparar_dados(dados)
+    metrics.start_page('first_page')
+
     st.markdown(
         """
         <div style='text-align: center; padding: 10px; background-color: #2A629A; color: white; font-size: 24px; border-radius: 10px;'>
@@ -143,16 +159,22 @@ def app():
         """, unsafe_allow_html=True)
     st.write("Nesta página podemos analisar e tirar conclusões relativamente ao comportamento e às preferências dos clientes.")
 
-    figura_3 = grafico_13(regression)
+    # Filtros cruzados da barra lateral (lojas, departamentos, faixas etárias, ...)
+    selecao = filters.selection()
+
     col1, col2 = st.columns(2)
-    with col1:
-        figura_1 = grafico_12(contagem_df)
-        st.plotly_chart(figura_1)
-    with col2:
-        st.plotly_chart(figura_3)
+    graficos = pool.ChartBatch()
+    graficos.add('grafico_12', col1.empty(), lambda: figcache.figura('first_page.grafico_12', lambda: grafico_12(preparar_dados(q.age_counts(**selecao))),
+                                                                      **selecao))
+    graficos.add('grafico_13', col2.empty(), lambda: figcache.figura('first_page.grafico_13', lambda: grafico_13(q.income_counts(**selecao)),
+                                                                      **selecao))
+    graficos.render()
 
     with st.container():
-        st.plotly_chart(grafico_7(df))
+        filtro_histograma()
+
+    metrics.end_page()
+
 
 if __name__ == "__main__":
     app()
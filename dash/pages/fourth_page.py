@@ -0,0 +1,127 @@
+import streamlit as st
+import plotly.express as px
+
+from grocery import figcache, metrics, periods, pool, products
+
+RANKINGS = {'Todos': None, 'Loja': 'store_id', 'Mês': 'period', 'Faixa Etária': 'household_age', 'Departamento': 'product_department'}
+POSICOES = 20
+
+#######################################Ranking de Produtos (gráfico de barras)#########################################################
+def grafico_1(ranking, titulo):
+    ranking = ranking.assign(produto=ranking['rank'].astype(str) + '. ' + ranking['product_type'].astype(str))
+    figura = px.bar(ranking, x='sales_value', y='produto', orientation='h', title=titulo,
+                    labels={'sales_value': 'Vendas', 'produto': 'Produtos', 'product_department': 'Departamento',
+                            'quantity': 'Quantidade', 'rows': 'Transações'},
+                    hover_data=['product_department', 'quantity', 'rows'],
+                    category_orders={'produto': ranking['produto'].tolist()},
+                    height=max(400, 25 * len(ranking)))
+
+    figura.update_traces(marker_color='#9FC131')
+    figura.update_layout(plot_bgcolor='white', title_x=0.3)
+    figura.update_xaxes(title_text='Total Vendas', gridcolor='lightgray')
+    figura.update_yaxes(title_text='', showgrid=False)
+    return figura
+
+#######################################Vendas do Produto por Mês (gráfico de linhas)#########################################################
+def grafico_2(vendas_por_mes, produto):
+    nomes = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+    todos = periods.months(vendas_por_mes['period'])
+    vendas_por_mes = vendas_por_mes.set_index(vendas_por_mes['period'].astype(str))[['sales_value']].reindex(todos).fillna(0)
+    vendas_por_mes['data'] = periods.month_labels(todos, nomes)
+
+    figura = px.line(vendas_por_mes, x='data', y='sales_value', title=f'Vendas de {produto} por Mês',
+                     labels={'data': 'Mês', 'sales_value': 'Vendas'}, color_discrete_sequence=['#6895D2'])
+    figura.update_layout(plot_bgcolor='white')
+    figura.update_xaxes(categoryorder='array', categoryarray=vendas_por_mes['data'].tolist())
+    return figura
+
+#######################################Vendas do Produto por Loja (gráfico de barras)#########################################################
+def grafico_3(vendas_por_loja, produto):
+    vendas_por_loja = vendas_por_loja.assign(store_id=vendas_por_loja['store_id'].astype(str))
+    figura = px.bar(vendas_por_loja, x='store_id', y='sales_value', title=f'Vendas de {produto} por Loja',
+                    labels={'store_id': 'Loja', 'sales_value': 'Vendas'}, color_discrete_sequence=['#2A629A'])
+    figura.update_xaxes(type='category')
+    figura.update_layout(plot_bgcolor='white')
+    return figura
+
+#######################################Vendas do Produto por Faixa Etária (gráfico de barras)#########################################################
+def grafico_4(vendas_por_faixa, produto):
+    figura = px.bar(vendas_por_faixa, x='household_age', y='sales_value', title=f'Vendas de {produto} por Faixa Etária',
+                    labels={'household_age': 'Faixa Etária', 'sales_value': 'Vendas'}, color_discrete_sequence=['#FFA62F'])
+    figura.update_xaxes(type='category')
+    figura.update_layout(plot_bgcolor='white')
+    return figura
+
+
+# O ranking e a pesquisa são fragmentos separados: mudar a dimensão ou a página do
+# ranking não refaz o detalhe do produto e vice-versa
+@st.fragment
+def ranking_produtos():
+    with metrics.fragment('fourth_page.ranking'):
+        col1, col2, col3 = st.columns([2, 1, 1])
+        ranking_por = col1.radio('Ranking por', list(RANKINGS), horizontal=True)
+        coluna = RANKINGS[ranking_por]
+        filtro = {}
+        if coluna is not None:
+            filtro[coluna] = col2.selectbox(ranking_por, products.values(coluna))
+        posicao = col3.number_input('A partir da posição', min_value=1, max_value=max(products.size(), 1),
+                                    value=1, step=POSICOES)
+
+        titulo = f'Produtos mais vendidos ({posicao}.º a {posicao + POSICOES - 1}.º)'
+        figura = figcache.figura('fourth_page.grafico_1', lambda: grafico_1(products.top(POSICOES, posicao - 1, **filtro), titulo),
+                                 posicao=posicao, **filtro)
+        metrics.plotly_chart('grafico_1', figura, use_container_width=True)
+
+@st.fragment
+def detalhe_produto():
+    with metrics.fragment('fourth_page.detalhe'):
+        texto = st.text_input('Pesquisar produto', placeholder='Início de uma palavra do nome, por exemplo "beef"')
+        # Sem pesquisa mostram-se os produtos mais vendidos
+        resultados = products.search(texto, 50) if texto.strip() else products.top(POSICOES)
+        if resultados.empty:
+            st.info(f'Nenhum produto com uma palavra começada por "{texto}".')
+            return
+
+        st.dataframe(resultados.rename(columns={'rank': 'Posição', 'product_type': 'Produto', 'product_department': 'Departamento',
+                                                'sales_value': 'Vendas', 'quantity': 'Quantidade', 'rows': 'Transações'}),
+                     hide_index=True, height=200)
+        produto = st.selectbox('Produto', resultados['product_type'].astype(str).tolist())
+
+        graficos = pool.ChartBatch()
+        graficos.add('grafico_2', st.empty(), lambda: figcache.figura(
+            'fourth_page.grafico_2', lambda: grafico_2(products.breakdown(produto, 'period'), produto), produto=produto),
+                     use_container_width=True)
+        col1, col2 = st.columns(2)
+        graficos.add('grafico_3', col1.empty(), lambda: figcache.figura(
+            'fourth_page.grafico_3', lambda: grafico_3(products.breakdown(produto, 'store_id'), produto), produto=produto),
+                     use_container_width=True)
+        graficos.add('grafico_4', col2.empty(), lambda: figcache.figura(
+            'fourth_page.grafico_4', lambda: grafico_4(products.breakdown(produto, 'household_age'), produto), produto=produto),
+                     use_container_width=True)
+        graficos.render()
+
+def app():
+    metrics.start_page('fourth_page')
+
+    st.markdown(
+        """
+        <div style='text-align: center; padding: 10px; background-color: #2A629A; color: white; font-size: 24px; border-radius: 10px;'>
+            Produtos
+        </div>
+        """, unsafe_allow_html=True)
+    st.write("Nesta página podemos explorar o catálogo de produtos: os mais vendidos no total e em cada loja, mês, "
+             "faixa etária ou departamento, e o detalhe das vendas de cada produto.")
+    st.caption("O ranking e a pesquisa usam todas as vendas da versão publicada, sem os filtros da barra lateral.")
+
+    st.subheader("Ranking de Produtos")
+    ranking_produtos()
+
+    st.subheader("Detalhe de um Produto")
+    with st.container():
+        detalhe_produto()
+
+    metrics.end_page()
+
+
+if __name__ == "__main__":
+    app()
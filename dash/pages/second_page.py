@@ -1,18 +1,14 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 
-#######################################Evolução Das Vendas Por Loja Ao Longo Do Ano (ScatterPlot)#########################################################
-def grafico_10(caminho_arquivo):
-    df = pd.read_csv(caminho_arquivo)
-
-    df['transaction_timestamp'] = pd.to_datetime(df['transaction_timestamp'])
+from grocery import baskets, boxstats, figcache, filters, metrics, pool, queries, store
 
-    df_monthly = df.groupby([df['transaction_timestamp'].dt.to_period('M'), 'store_id']).agg(
-        {'sales_value': 'sum', 'quantity': 'sum'}
-    ).reset_index()
+q = queries.backend()
 
+#######################################Evolução Das Vendas Por Loja Ao Longo Do Ano (ScatterPlot)#########################################################
+def grafico_10(df_monthly):
+    df_monthly = df_monthly.rename(columns={'period': 'transaction_timestamp'})
     df_monthly['transaction_timestamp'] = df_monthly['transaction_timestamp'].astype(str)
 
     sales_value_min = df_monthly['sales_value'].min()
@@ -61,15 +57,20 @@ def grafico_10(caminho_arquivo):
     return figura_6
 
     #######################################Vendas Totais Por Loja (BoxPlot)#########################################################
-def grafico_4(caminho_arquivo):
-    df = pd.read_csv(caminho_arquivo)
-
-    # Cria um boxplot para cada loja
-    grupo_por_loja = df.groupby('store_id')
+def grafico_4(resumos):
+    # Cria um boxplot para cada loja a partir das estatísticas já calculadas
     boxplots = []
 
-    for i, (store_id, vendas) in enumerate(grupo_por_loja):
-        boxplots.append(go.Box(y=vendas['sales_value'], name=f'Loja {store_id}', marker_color='#1f77b4'))
+    for store_id, resumo in resumos.items():
+        nome = f'Loja {store_id}'
+        boxplots.append(go.Box(x=[nome], q1=[resumo['q1']], median=[resumo['median']], q3=[resumo['q3']],
+                               lowerfence=[resumo['lowerfence']], upperfence=[resumo['upperfence']],
+                               mean=[resumo['mean']], name=nome, marker_color='#1f77b4', boxpoints=False))
+
+        # Outliers (amostra limitada) desenhados à parte
+        if resumo['outliers']:
+            boxplots.append(go.Scatter(x=[nome] * len(resumo['outliers']), y=resumo['outliers'], mode='markers',
+                                       name=nome, marker=dict(color='#1f77b4', size=4), hoverinfo='y'))
 
     layout_boxplot = go.Layout(
         title={'text': 'Vendas Totais por Loja', 'x': 0.5},
@@ -86,7 +87,73 @@ def grafico_4(caminho_arquivo):
     return figura_3
 
 
+#######################################Distribuição Do Valor Dos Cestos (histograma)#########################################################
+def grafico_14(histograma, percentis):
+    figura = px.bar(histograma, x='bin_start', y='baskets', title='Distribuição do valor dos cestos',
+                    labels={'bin_start': 'Valor do Cesto', 'baskets': 'N.º de Cestos'},
+                    color_discrete_sequence=['#1f77b4'], width=620, height=450)
+    figura.update_traces(width=histograma['bin_end'] - histograma['bin_start'], offset=0,
+                         customdata=histograma[['bin_end']],
+                         hovertemplate='%{x:.2f} - %{customdata[0]:.2f}: %{y} cestos<extra></extra>')
+
+    # Quartis e percentil 90 marcados no eixo
+    for q, valor in percentis.items():
+        figura.add_vline(x=valor, line=dict(color='grey', width=1, dash='dot'),
+                         annotation_text=f'P{int(q * 100)}', annotation_position='top')
+
+    figura.update_layout(plot_bgcolor='white', title_x=0.2, bargap=0)
+    return figura
+
+#######################################Cesto Médio Por Faixa Etária (gráfico de barras)#########################################################
+def grafico_15(medias):
+    figura = px.bar(medias, x='household_age', y='mean_total_value', title='Cesto médio por faixa etária',
+                    labels={'household_age': 'Faixa Etária', 'mean_total_value': 'Cesto Médio',
+                            'mean_items': 'Produtos por Cesto', 'baskets': 'N.º de Cestos'},
+                    hover_data=['mean_items', 'baskets'],
+                    color_discrete_sequence=['#1f77b4'], width=620, height=450)
+    figura.update_xaxes(type='category')
+    figura.update_layout(plot_bgcolor='white', title_x=0.2)
+    return figura
+
+
+# O filtro da loja e o boxplot formam um fragmento: mudar a loja não redesenha o
+# gráfico de dispersão
+@st.fragment
+def boxplot_por_loja():
+    with metrics.fragment('second_page.grafico_4'):
+        # Filtro para selecionar uma loja
+        lojas = store.stores()
+        lojas_disponiveis = [str(loja) for loja in lojas]
+        loja_selecionada = st.selectbox('Selecione uma loja:', options=['Todas as lojas'] + lojas_disponiveis)
+
+        # Filtrar os boxplots de acordo com a loja selecionada (reutiliza as estatísticas calculadas)
+        graficos = pool.ChartBatch()
+        if loja_selecionada != 'Todas as lojas':
+            graficos.add('grafico_4', st.empty(), lambda: figcache.figura(
+                'second_page.grafico_4',
+                lambda: grafico_4({loja: resumo for loja, resumo in boxstats.por_loja().items() if str(loja) == loja_selecionada}),
+                loja=loja_selecionada))
+        else:
+            graficos.add('grafico_4', st.empty(),
+                         lambda: figcache.figura('second_page.grafico_4', lambda: grafico_4(boxstats.por_loja()), loja=None))
+
+        # Distribuição dos cestos, com o mesmo filtro de loja e o intervalo de datas global
+        periodo = filters.period()
+        filtros = {} if loja_selecionada == 'Todas as lojas' else {'store_id': lojas[lojas_disponiveis.index(loja_selecionada)]}
+        filtros.update(periodo)
+        col1, col2 = st.columns(2)
+        graficos.add('grafico_14', col1.empty(), lambda: figcache.figura(
+            'second_page.grafico_14',
+            lambda: grafico_14(baskets.histogram(**filtros), baskets.percentiles((0.25, 0.5, 0.75, 0.9), **filtros)),
+            loja=loja_selecionada, **periodo))
+        graficos.add('grafico_15', col2.empty(), lambda: figcache.figura(
+            'second_page.grafico_15', lambda: grafico_15(baskets.mean_by('household_age', **filtros)), loja=loja_selecionada,
+            **periodo))
+        graficos.render()
+
 def app():
+    metrics.start_page('second_page')
+
     st.markdown(
         """
         <div style='text-align: center; padding: 10px; background-color: #2A629A; color: white; font-size: 24px; border-radius: 10px;'>
@@ -95,27 +162,19 @@ def app():
         """, unsafe_allow_html=True)
     st.write("Nesta página tiramos conclusões sobre o desempenho e as características das lojas.")
 
-    caminho_arquivo = 'grocery_final.csv'
-
-    # Criar os gráficos
-    figura_6 = grafico_10(caminho_arquivo)
-    figura_3 = grafico_4(caminho_arquivo)
+    # O gráfico de dispersão começa a ser calculado já; com GROCERY_WORKERS > 1 fica pronto
+    # enquanto o fragmento calcula os seus gráficos
+    grafico_dispersao = pool.ChartBatch()
+    periodo = filters.period()
+    grafico_dispersao.add('grafico_10', st.empty(), lambda: figcache.figura('second_page.grafico_10', lambda: grafico_10(q.store_period(**periodo)),
+                                                                            **periodo))
+    grafico_dispersao.start()
 
-    # Mostrar o gráfico de dispersão
-    st.plotly_chart(figura_6)
+    boxplot_por_loja()
 
-    # Filtro para selecionar uma loja
-    df = pd.read_csv(caminho_arquivo)
-    lojas_disponiveis = sorted(df['store_id'].astype(str).unique())
-    loja_selecionada = st.selectbox('Selecione uma loja:', options=['Todas as lojas'] + lojas_disponiveis)
+    grafico_dispersao.render()
 
-    # Filtrar os boxplots de acordo com a loja selecionada
-    if loja_selecionada != 'Todas as lojas':
-        boxplot_selecionado = [boxplot for boxplot in figura_3.data if boxplot['name'] == f'Loja {loja_selecionada}']
-        figura_3_filtrada = go.Figure(data=boxplot_selecionado, layout=figura_3.layout)
-        st.plotly_chart(figura_3_filtrada)
-    else:
-        st.plotly_chart(figura_3)
+    metrics.end_page()
 
 
 if __name__ == "__main__":
@@ -1,17 +1,15 @@
 import streamlit as st
-import pandas as pd
 import numpy as np
 import plotly.express as px
+import plotly.graph_objects as go
 
-st.set_page_config(page_title="Vendas",page_icon=':green_apple:',layout="wide",initial_sidebar_state='expanded')
-caminho_arquivo = 'grocery_final.csv'
-dados = pd.read_csv(caminho_arquivo)
+from grocery import figcache, filters, metrics, periods, pool, queries, series, store
 
+q = queries.backend()
 
-#######################################Vendas Por Departamento(gráfico de barras)#########################################################
-def grafico1(dados, loja_selecionada):
-    vendas_por_departamento = dados[dados['store_id'] == loja_selecionada].groupby('product_department')['sales_value'].sum().reset_index()
 
+#######################################Vendas Por Departamento(gráfico de barras)#########################################################
+def grafico1(vendas_por_departamento, loja_selecionada):
     colors = ['lightgray' for i in range(len(vendas_por_departamento))]
 
     figura = px.bar(vendas_por_departamento, y='product_department', x='sales_value',
@@ -31,20 +29,18 @@ def grafico1(dados, loja_selecionada):
     return figura
 
 #######################################Evolução das vendas totais por loja (grafico de linhas)#########################################################
-def grafico2(dados, loja_selecionada):
-    dados['data'] = pd.to_datetime(dados['transaction_timestamp']).dt.to_period('M')
-
-    # Agrupa por loja e mês e calcula a soma de 'sales_value'
-    vendas_por_loja = dados[dados['store_id'] == loja_selecionada].groupby(['store_id', 'data'])['sales_value'].sum().reset_index()
-
-    # Converte a coluna 'data' para string com o nome do mês
-    vendas_por_loja['data'] = vendas_por_loja['data'].dt.strftime('%b')
+def grafico2(vendas_por_loja, loja_selecionada):
+    # Cria uma lista de meses (ano-mês) para garantir que todos os meses estejam presentes no eixo X
+    nomes = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+    todos = periods.months(vendas_por_loja['period'])
 
-    # Cria uma lista de meses para garantir que todos os meses estejam presentes no eixo X
-    meses = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-    vendas_por_loja = vendas_por_loja.set_index('data').reindex(meses).reset_index()
+    vendas_por_loja = vendas_por_loja.set_index(vendas_por_loja['period'].astype(str))[['sales_value']].reindex(todos)
     vendas_por_loja = vendas_por_loja.fillna(0)
 
+    # Converte o período para o nome abreviado do mês (com o ano, se houver mais de um)
+    meses = periods.month_labels(todos, nomes)
+    vendas_por_loja['data'] = meses
+
     figura = px.line(vendas_por_loja, x='data', y='sales_value',
                      labels={'data': 'Mês', 'sales_value': 'Vendas'},
                      color_discrete_sequence=["#6895D2"])
@@ -57,10 +53,44 @@ def grafico2(dados, loja_selecionada):
 
     return figura
 
+#######################################Evolução das vendas da loja ao dia ou à hora (gráfico de linhas)#########################################################
+def grafico4(vendas_por_loja, loja_selecionada, frequencia):
+    # Detalhe do grafico2: traço WebGL, com a série já reduzida no servidor (grocery.series)
+    figura = px.line(vendas_por_loja, x='time', y='sales_value', render_mode='webgl',
+                     labels={'time': 'Hora' if frequencia == 'h' else 'Dia', 'sales_value': 'Vendas'},
+                     color_discrete_sequence=["#6895D2"])
+
+    figura.update_layout(plot_bgcolor='white')
+
+    return figura
+
+def evolucao_loja(loja_selecionada, janela):
+    vendas_por_loja, frequencia = series.store_sales(loja_selecionada, *janela)
+    return grafico4(vendas_por_loja, loja_selecionada, frequencia)
+
+#######################################Comparação com o período anterior ou homólogo (barras e linha)#########################################################
+AGREGACOES = {'Semana': 'week', 'Mês': 'month', 'Trimestre': 'quarter', 'Ano': 'year'}
+COMPARACOES = {'Ano anterior': 'year', 'Período anterior': 'previous'}
+
+def grafico5(comparacao, comparar_com):
+    # Barras com as vendas de cada período e linha com as do período de comparação;
+    # a variação aparece ao passar o rato
+    figura = go.Figure()
+    figura.add_trace(go.Bar(x=comparacao['date'], y=comparacao['sales_value'], name='Vendas', marker_color='#6895D2',
+                            customdata=comparacao[['delta', 'delta_pct']],
+                            hovertemplate='%{x|%d/%m/%Y}<br>Vendas: %{y:,.2f}<br>Diferença: %{customdata[0]:+,.2f} '
+                                          '(%{customdata[1]:+.1%})<extra></extra>'))
+    figura.add_trace(go.Scatter(x=comparacao['date'], y=comparacao['previous'], name=comparar_com, mode='lines+markers',
+                                line=dict(color='#FFA62F'), connectgaps=False))
+
+    figura.update_layout(plot_bgcolor='white', height=400, legend=dict(orientation='h', yanchor='bottom', y=1.02, x=0))
+    figura.update_yaxes(title_text='Vendas', gridcolor='lightgray')
+
+    return figura
+
 #######################################Vendas De Produtos Por Faixas Etárias(gráfico de barras)#########################################################
-def grafico3(dados, faixas_etarias_escolhidas):
-    dados_filtrados = dados[dados['household_age'].isin(faixas_etarias_escolhidas)]
-    contagem_produtos = dados_filtrados.groupby(['household_age', 'product_department']).size().unstack(fill_value=0)
+def grafico3(contagem_produtos, faixas_etarias_escolhidas):
+    contagem_produtos = contagem_produtos.set_index(['household_age', 'product_department'])['rows'].unstack(fill_value=0)
     vendas_por_departamento = contagem_produtos.reset_index().melt(id_vars='household_age', var_name='product_department', value_name='sales_value')
     figura = px.bar(vendas_por_departamento,
                    y='sales_value',
@@ -78,7 +108,68 @@ def grafico3(dados, faixas_etarias_escolhidas):
                                    'COSMETICS': 'Cosméticos', 'NUTRITION': 'Nutrição', 'SPIRITS': 'Bebidas Alcoólicas'})
     return figura
 
+# Cada filtro e os gráficos que dependem dele formam um fragmento: mudar a loja não
+# recalcula o gráfico das faixas etárias e vice-versa
+@st.fragment
+def vendas_por_loja():
+    with metrics.fragment('third_page.loja'):
+        lojas = store.stores()
+        loja_selecionada = st.selectbox('Selecione uma loja', lojas)
+
+        col1, col2 = st.columns(2)
+        graficos = pool.ChartBatch()
+        selecao = filters.selection()
+
+        with col1:
+            st.subheader(f"Vendas por Departamento na Loja {loja_selecionada}")
+            graficos.add('grafico1', st.empty(),
+                         lambda: figcache.figura('third_page.grafico1', lambda: grafico1(q.store_department(loja_selecionada, **selecao), loja_selecionada),
+                                                 loja=loja_selecionada, **selecao),
+                         use_container_width=True)
+
+        with col2:
+            st.subheader(f"Evolução das Vendas na Loja {loja_selecionada}")
+            periodo = filters.period()
+            janela = filters.drill_down('third_page.grafico2', periodo)
+            if janela is None:
+                graficos.add('grafico2', st.empty(),
+                             lambda: figcache.figura('third_page.grafico2', lambda: grafico2(q.store_month(loja_selecionada, **periodo), loja_selecionada),
+                                                     loja=loja_selecionada, **periodo),
+                             use_container_width=True)
+            else:
+                graficos.add('grafico4', st.empty(),
+                             lambda: figcache.figura('third_page.grafico4', lambda: evolucao_loja(loja_selecionada, janela),
+                                                     loja=loja_selecionada, janela=janela),
+                             use_container_width=True)
+
+        # Comparação de cada período com o anterior ou com o homólogo do ano anterior (rollups de calendário)
+        st.subheader(f"Comparação de Períodos na Loja {loja_selecionada}")
+        col1, col2 = st.columns(2)
+        agregacao = col1.selectbox('Agregação', list(AGREGACOES), index=1)
+        comparar_com = col2.radio('Comparar com', list(COMPARACOES), horizontal=True)
+        graficos.add('grafico5', st.empty(),
+                     lambda: figcache.figura('third_page.grafico5',
+                                             lambda: grafico5(periods.compare(AGREGACOES[agregacao], against=COMPARACOES[comparar_com],
+                                                                              store_id=loja_selecionada, **periodo), comparar_com),
+                                             loja=loja_selecionada, agregacao=agregacao, comparar_com=comparar_com, **periodo),
+                     use_container_width=True)
+
+        graficos.render()
+
+@st.fragment
+def vendas_por_faixa_etaria():
+    with metrics.fragment('third_page.faixas_etarias'):
+        faixas_etarias = store.AGE_ORDER
+        faixas_etarias_escolhidas = st.multiselect('Selecione as faixas etárias para comparar', faixas_etarias,
+                                                   default=faixas_etarias[:2])
+        selecao = filters.selection()
+        figura3 = figcache.figura('third_page.grafico3', lambda: grafico3(q.age_department(faixas_etarias_escolhidas, **selecao), faixas_etarias_escolhidas),
+                                  faixas=faixas_etarias_escolhidas, **selecao)
+        metrics.plotly_chart('grafico3', figura3, use_container_width=True)
+
 def app():
+    metrics.start_page('third_page')
+
     st.markdown(
         """
         <div style='text-align: center; padding: 10px; background-color: #2A629A; color: white; font-size: 24px; border-radius: 10px;'>
@@ -87,30 +178,13 @@ def app():
         """, unsafe_allow_html=True)
     st.write("Nesta página podemos analisar e tirar conclusões sobre o desempenho e as tendências das vendas.")
 
-    lojas = dados['store_id'].unique()
-    loja_selecionada = st.selectbox('Selecione uma loja', lojas)
-
-    col1, col2 = st.columns(2)
-
-    with col1:
-        st.subheader(f"Vendas por Departamento na Loja {loja_selecionada}")
-        figura1 = grafico1(dados, loja_selecionada)
-        st.plotly_chart(figura1, use_container_width=True)
-
-    with col2:
-        st.subheader(f"Evolução das Vendas na Loja {loja_selecionada}")
-        figura2 = grafico2(dados, loja_selecionada)
-        st.plotly_chart(figura2, use_container_width=True)
-
+    vendas_por_loja()
 
     st.subheader("Vendas de Produtos por Faixas Etárias")
     with st.container():
-        faixas_etarias = dados['household_age'].unique()
-        faixas_etarias_escolhidas = st.multiselect('Selecione as faixas etárias para comparar', faixas_etarias,
-                                                   default=faixas_etarias[:2])
-        figura3 = grafico3(dados, faixas_etarias_escolhidas)
-        st.plotly_chart(figura3, use_container_width=True)
+        vendas_por_faixa_etaria()
 
+    metrics.end_page()
 
 
 if __name__ == "__main__":